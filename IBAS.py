@@ -1,13 +1,17 @@
 import logging
-from flask import Flask, request, jsonify
+from flask import Flask, Blueprint, request, jsonify, Response
 import requests
-from pymongo import MongoClient
+from requests.adapters import HTTPAdapter
+from pymongo import MongoClient, ReturnDocument, UpdateOne
+from pymongo.errors import DuplicateKeyError
 import json
 import os
 import signal
 import sys
 import csv
-from utils import generate_key, encrypt_data, decrypt_data, get_hashed_data, check_hash
+from utils import (generate_key, encrypt_bytes, decrypt_bytes, decrypt_data, check_hash, wrap_key, unwrap_key,
+                   merkle_leaf_hash, build_merkle_tree, verify_merkle_proof,
+                   RECORD_FORMAT_VERSION, COMPACT_RECORD_FORMAT_VERSION)
 from Crypto.PublicKey import RSA
 from Crypto.Hash import SHA256
 from Crypto.Signature import pkcs1_15
@@ -17,7 +21,25 @@ from flask_cors import CORS
 import uuid
 from datetime import timedelta
 from bson import ObjectId
-from functools import wraps
+from functools import wraps, lru_cache
+from itertools import combinations
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+import threading
+import time
+import gzip
+import math
+import binascii
+from base64 import b64decode
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
 
 # Configure logging
 logging.basicConfig(
@@ -29,11 +51,12 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
-app = Flask(__name__)
-CORS(app)  # This will allow all domains to access your Flask app
+# Routes are registered on a blueprint and the Flask app is built by create_app(), so nothing
+# connection-related is created at import time, before gunicorn forks its workers
+bp = Blueprint('ibas', __name__)
 
 # Set secure HTTP headers
-@app.after_request
+@bp.after_app_request
 def set_secure_headers(response):
     response.headers['Strict-Transport-Security'] = 'max-age=31536000; includeSubDomains'
     response.headers['X-Content-Type-Options'] = 'nosniff'
@@ -41,6 +64,35 @@ def set_secure_headers(response):
     response.headers['Content-Security-Policy'] = "default-src 'self'"
     return response
 
+# Compress large response bodies according to the client's Accept-Encoding
+@bp.after_app_request
+def compress_response(response):
+    if (response.status_code < 200 or response.status_code >= 300
+            or response.direct_passthrough or 'Content-Encoding' in response.headers):
+        return response
+
+    body = response.get_data()
+    if len(body) < COMPRESSION_MIN_SIZE:
+        return response
+
+    response.vary.add('Accept-Encoding')
+    accepted = request.accept_encodings
+    if brotli and accepted['br']:
+        response.set_data(brotli.compress(body, quality=BROTLI_QUALITY))
+        response.headers['Content-Encoding'] = 'br'
+    elif accepted['gzip']:
+        response.set_data(gzip.compress(body, compresslevel=GZIP_LEVEL))
+        response.headers['Content-Encoding'] = 'gzip'
+    return response
+
+def json_response(payload, status=200):
+    """Builds a JSON response, using orjson when it is installed since it is much faster than the stdlib encoder."""
+    if orjson:
+        body = orjson.dumps(payload)
+    else:
+        body = json.dumps(payload, separators=(',', ':')).encode('utf-8')
+    return Response(body, status=status, mimetype='application/json')
+
 # Load environment variables from .env file
 load_dotenv()
 
@@ -52,67 +104,153 @@ TOMORROWIO_API_URL = os.environ.get("TOMORROWIO_API_URL")
 VISUALCROSSING_API_KEY = os.environ.get("VISUALCROSSING_API_KEY")
 VISUALCROSSING_API_URL = os.environ.get("VISUALCROSSING_API_URL")
 MONGO_URI = os.environ.get("AZURE_COSMOS_CONNECTIONSTRING")
+KEYRING_MASTER_KEY = os.environ.get("KEYRING_MASTER_KEY")  # Base64 AES key that wraps the per-client key-encryption keys
+
+# Provider aggregation settings
+WEATHER_QUORUM_MODE = os.environ.get("WEATHER_QUORUM_MODE", "true").lower() == "true"
+PROVIDER_TIMEOUT = float(os.environ.get("PROVIDER_TIMEOUT", "10"))  # Overall budget per aggregation, in seconds
+PROVIDER_HEDGE_DELAY = float(os.environ.get("PROVIDER_HEDGE_DELAY", "0"))  # 0 disables hedged requests
+CIRCUIT_BREAKER_THRESHOLD = int(os.environ.get("CIRCUIT_BREAKER_THRESHOLD", "3"))
+CIRCUIT_BREAKER_RESET_TIMEOUT = float(os.environ.get("CIRCUIT_BREAKER_RESET_TIMEOUT", "30"))
+
+# Rollup settings
+ROLLUP_UPDATE_RETRIES = int(os.environ.get("ROLLUP_UPDATE_RETRIES", "5"))
+ROLLUP_BACKFILL_CHUNK = int(os.environ.get("ROLLUP_BACKFILL_CHUNK", "500"))  # Records decrypted per backfill step
+ROLLUP_BACKFILL_STALE_AFTER = int(os.environ.get("ROLLUP_BACKFILL_STALE_AFTER", "300"))  # Seconds before another worker takes over a backfill
+ROLLUP_BACKFILL_GRACE = int(os.environ.get("ROLLUP_BACKFILL_GRACE", "60"))  # Seconds the write path has to roll up a new record itself
+
+# Response compression settings
+COMPRESSION_MIN_SIZE = int(os.environ.get("COMPRESSION_MIN_SIZE", "1024"))  # Bytes
+GZIP_LEVEL = int(os.environ.get("GZIP_LEVEL", "6"))
+BROTLI_QUALITY = int(os.environ.get("BROTLI_QUALITY", "5"))
+
+# Rate limiting and load shedding settings
+RATE_LIMIT_PER_MINUTE = float(os.environ.get("RATE_LIMIT_PER_MINUTE", "60"))  # Sustained requests per API key
+RATE_LIMIT_BURST = float(os.environ.get("RATE_LIMIT_BURST", "10"))  # Token bucket capacity per API key
+RATE_LIMIT_BACKEND = os.environ.get("RATE_LIMIT_BACKEND", "memory").lower()  # "memory" or "mongo" to share buckets across workers
+GUNICORN_THREADS = int(os.environ.get("GUNICORN_THREADS", "4"))  # Request threads per worker, also read by gunicorn.conf.py
+# Per worker. The default is one aggregation over the three providers per request thread, so load is
+# shed once hedged, abandoned or bulk calls pile up on top of what the worker's threads normally run
+MAX_INFLIGHT_PROVIDER_CALLS = int(os.environ.get("MAX_INFLIGHT_PROVIDER_CALLS", str(GUNICORN_THREADS * 3)))
+LOAD_SHED_RETRY_AFTER = int(os.environ.get("LOAD_SHED_RETRY_AFTER", "5"))  # Seconds
+
+# Signing settings
+SIGNING_MODE = os.environ.get("SIGNING_MODE", "record").lower()  # "record" signs every record, "batch" signs a Merkle root per window
+BATCH_SIGNING_WINDOW = float(os.environ.get("BATCH_SIGNING_WINDOW", "0.5"))  # Seconds records are collected before signing
+# A bulk request takes one rate limit token per capital, so it can never hold more capitals than the bucket holds tokens
+BULK_INGEST_MAX_CAPITALS = min(int(os.environ.get("BULK_INGEST_MAX_CAPITALS", "50")), math.floor(RATE_LIMIT_BURST))
+# Capitals fetched at once per bulk request. Each one is a full provider aggregation counted against
+# MAX_INFLIGHT_PROVIDER_CALLS, so this is kept well below what it takes to shed the worker's other requests
+BULK_INGEST_CONCURRENCY = int(os.environ.get("BULK_INGEST_CONCURRENCY", "2"))
+BULK_INGEST_DEADLINE = float(os.environ.get("BULK_INGEST_DEADLINE", "30"))  # Seconds before a bulk request stops waiting for capitals
+
+# Connection pool settings
+MONGO_MAX_POOL_SIZE = int(os.environ.get("MONGO_MAX_POOL_SIZE", "50"))
+MONGO_MIN_POOL_SIZE = int(os.environ.get("MONGO_MIN_POOL_SIZE", "0"))
+HTTP_POOL_SIZE = int(os.environ.get("HTTP_POOL_SIZE", "10"))  # Connections kept per provider host
+
+class ForkSafeResource:
+    """Creates a resource on first use and recreates it in a forked child, since sockets and threads don't survive fork."""
+
+    def __init__(self, factory):
+        self.factory = factory
+        self.resource = None
+        self.pid = None
+        self.lock = threading.Lock()
+
+    def get(self):
+        if self.pid != os.getpid():
+            with self.lock:
+                if self.pid != os.getpid():
+                    self.resource = self.factory()
+                    self.pid = os.getpid()
+        return self.resource
+
+def create_http_session():
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=len(WEATHER_PROVIDERS), pool_maxsize=HTTP_POOL_SIZE)
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+    return session
 
 # MongoDB setup
-client = MongoClient(MONGO_URI)
-db = client.get_database('ibas-server')
-weatherRecords = db.weather_records
-customerDB = client.get_database('Customers')
-
-# Transit Key Database Setup
-transit_key_db = client.get_database('Transit_Key')
-
-# Load capitals data from CSV
-capitals_data = {}
-with open('capitals.csv', mode='r', encoding='utf-8-sig') as infile:
-    reader = csv.DictReader(infile)
-    for row in reader:
-        capital = row['capital'].strip().lower()
-        lat = float(row['lat'])
-        lon = float(row['lon'])
-        capitals_data[capital] = (lat, lon)
+mongo_client = ForkSafeResource(lambda: MongoClient(
+    MONGO_URI,
+    maxPoolSize=MONGO_MAX_POOL_SIZE,
+    minPoolSize=MONGO_MIN_POOL_SIZE
+))
+http_session = ForkSafeResource(create_http_session)
+
+def get_db():
+    return mongo_client.get().get_database('ibas-server')
+
+def get_customer_db():
+    return mongo_client.get().get_database('Customers')
+
+def get_weather_record_db():
+    return mongo_client.get().get_database('Weather_Record')
+
+# Transit Key Database Setup, only read for records written before envelope encryption
+def get_transit_key_db():
+    return mongo_client.get().get_database('Transit_Key')
+
+def get_key_ring_db():
+    return mongo_client.get().get_database('Key_Ring')
+
+# Load capitals data from CSV, once per process
+@lru_cache(maxsize=None)
+def get_capitals_data():
+    capitals_data = {}
+    capitals_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'capitals.csv')
+    with open(capitals_path, mode='r', encoding='utf-8-sig') as infile:
+        reader = csv.DictReader(infile)
+        for row in reader:
+            capital = row['capital'].strip().lower()
+            lat = float(row['lat'])
+            lon = float(row['lon'])
+            capitals_data[capital] = (lat, lon)
+    return capitals_data
 
 def is_within_margin(value1, value2, margin):
     if value1 == 0 and value2 == 0:
         return True  # Both values are zero, so they are equal
     return abs(value1 - value2) / max(value1, value2) <= margin
 
-def check_weather_data_consistency(data):
-    margins = {
-        "temperature": 0.2,  # 20%
-        "humidity": 0.4,     # 40%
-        "pressure": 0.2,     # 20%
-        "windSpeed": 0.5,    # 50%
-        "cloudCover": 0.3,   # 30%
-        "precipitation": 1.0 # 100%
-    }
-
-    tomorrowio = data['tomorrowio']
-    visualcrossing = data['visualcrossing']
-    openweather = data['openweather']
-
-    sources = {
-        'tomorrowio': tomorrowio,
-        'visualcrossing': visualcrossing,
-        'openweather': openweather
+CONSISTENCY_MARGINS = {
+    "temperature": 0.2,  # 20%
+    "humidity": 0.4,     # 40%
+    "pressure": 0.2,     # 20%
+    "windSpeed": 0.5,    # 50%
+    "cloudCover": 0.3,   # 30%
+    "precipitation": 1.0 # 100%
+}
+
+CONSISTENCY_FIELDS = ["temperature", "humidity", "pressure", "windSpeed", "cloudCover", "precipitation"]
+
+def agreeing_fields(source1, source2):
+    """Returns the fields on which two provider readings are within the margin of each other."""
+    return {
+        field for field in CONSISTENCY_FIELDS
+        if is_within_margin(source1[field], source2[field], CONSISTENCY_MARGINS[field])
     }
 
-    fields = ["temperature", "humidity", "pressure", "windSpeed", "cloudCover", "precipitation"]
+def check_weather_data_consistency(data):
+    # Consider every provider present in the data, so a quorum of two can be checked as well as all three
+    sources = {name: data[name] for name in WEATHER_PROVIDERS if name in data}
 
     valid_data = {}
 
-    for field in fields:
+    for field in CONSISTENCY_FIELDS:
         values = {source: sources[source][field] for source in sources}
 
-        # Check if all three values are within the margin
-        all_within_margin = (
-            is_within_margin(values['tomorrowio'], values['visualcrossing'], margins[field]) and
-            is_within_margin(values['tomorrowio'], values['openweather'], margins[field]) and
-            is_within_margin(values['visualcrossing'], values['openweather'], margins[field])
+        # Check if all values are within the margin of each other
+        all_within_margin = all(
+            is_within_margin(value1, value2, CONSISTENCY_MARGINS[field])
+            for value1, value2 in combinations(values.values(), 2)
         )
 
-        if all_within_margin:
-            # If all three are within the margin, average all three
+        if all_within_margin or len(values) < 3:
+            # If all are within the margin (or there is no majority to pick an outlier from), average all of them
             valid_data[field] = list(values.values())
             logger.info(f"All sources within margin for field {field}. Using all values.")
         else:
@@ -138,7 +276,8 @@ def check_weather_data_consistency(data):
     return True, valid_data  # Always return True since we're retaining all fields
 
 # Function to validate API keys and check permissions
-def validate_api_key(permission_required):
+def validate_api_key(permission_required, cost=None):
+    # `cost` returns how many requests the current one counts as against the usage and rate limits
     def decorator(f):
         @wraps(f)
         def decorated_function(*args, **kwargs):
@@ -147,7 +286,7 @@ def validate_api_key(permission_required):
                 return jsonify({"error": "API key is required"}), 401
 
             # Check in Admin collection first
-            admin_doc = db.Admin_API_Keys.find_one({"admins.api_key": api_key})
+            admin_doc = get_db().Admin_API_Keys.find_one({"admins.api_key": api_key})
             if admin_doc:
                 admin = next((admin for admin in admin_doc['admins'] if admin['api_key'] == api_key), None)
                 if admin and permission_required in admin['permissions']:
@@ -156,26 +295,44 @@ def validate_api_key(permission_required):
                     return jsonify({"error": "Permission denied"}), 403
             
             # If not found in Admin, check in Client collection
-            client_doc = db.Customer_API_Keys.find_one({"clients.api_key": api_key})
+            client_doc = get_db().Customer_API_Keys.find_one({"clients.api_key": api_key})
             if client_doc:
                 client = next((client for client in client_doc['clients'] if client['api_key'] == api_key), None)
-                if client and permission_required in client['permissions']:
-                    return f(*args, **kwargs)
-                else:
+                if not client or permission_required not in client['permissions']:
                     return jsonify({"error": "Permission denied"}), 403
 
+                request_cost = cost() if cost else 1
+                if client.get('requests_made', 0) + request_cost > client.get('usage_limit', math.inf):
+                    logger.warning(f"Usage limit reached for client '{client['client_name']}'")
+                    return jsonify({"error": "Usage limit exceeded"}), 429
+
+                if request_cost > rate_limiter.capacity:
+                    # The bucket can never hold this many tokens, so retrying would not help
+                    logger.warning(f"Request of client '{client['client_name']}' costs more than the rate limit burst")
+                    return jsonify({"error": f"At most {math.floor(rate_limiter.capacity)} requests can be made at once"}), 400
+
+                allowed, retry_after = rate_limiter.consume(api_key, request_cost)
+                if not allowed:
+                    logger.warning(f"Rate limit exceeded for client '{client['client_name']}'")
+                    response = jsonify({"error": "Rate limit exceeded"})
+                    response.headers['Retry-After'] = str(math.ceil(retry_after))
+                    return response, 429
+
+                return f(*args, **kwargs)
+
             return jsonify({"error": "Invalid API key"}), 401
         return decorated_function
     return decorator
 
 # Function to test the MongoDB connection
-@app.before_first_request
 def test_db_connection():
     try:
-        client.admin.command('ping')
+        mongo_client.get().admin.command('ping')
         logger.info("MongoDB connection established successfully.")
+        return True
     except Exception as e:
         logger.error(f"Failed to connect to MongoDB: {e}")
+        return False
 
 class SimpleSigner:
     def __init__(self, identity):
@@ -213,7 +370,179 @@ class SimpleSigner:
                 return False
         return True
 
-@app.route('/setup', methods=['GET'])
+class CircuitBreaker:
+    """Tracks consecutive failures of a provider and skips it while it is failing."""
+
+    def __init__(self, name, failure_threshold, reset_timeout):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at = None
+        self.lock = threading.Lock()
+
+    def allow_request(self):
+        with self.lock:
+            if self.opened_at is None:
+                return True
+            if time.monotonic() - self.opened_at >= self.reset_timeout:
+                # Half-open: let a single trial request through and hold the circuit open for the others
+                self.opened_at = time.monotonic()
+                logger.info(f"Circuit for provider '{self.name}' half-open, sending trial request")
+                return True
+            return False
+
+    def record_success(self):
+        with self.lock:
+            if self.opened_at is not None:
+                logger.info(f"Circuit for provider '{self.name}' closed")
+            self.failures = 0
+            self.opened_at = None
+
+    def record_failure(self):
+        with self.lock:
+            self.failures += 1
+            if self.failures >= self.failure_threshold:
+                if self.opened_at is None:
+                    logger.warning(f"Circuit for provider '{self.name}' opened after {self.failures} consecutive failures")
+                self.opened_at = time.monotonic()
+
+class KeyRing:
+    """Per-client key-encryption keys, stored wrapped under the master key and cached unwrapped in memory."""
+
+    def __init__(self, master_key):
+        self.master_key = master_key
+        self.keys = {}
+        self.lock = threading.Lock()
+
+    def find_kek(self, client_name):
+        """Returns the client's key-encryption key, or None if the client has none yet. Never creates one."""
+        kek = self.keys.get(client_name)
+        if kek:
+            return kek
+
+        if not self.master_key:
+            raise RuntimeError("KEYRING_MASTER_KEY is not set")
+
+        key_doc = get_key_ring_db().client_keys.find_one({"_id": client_name})
+        if not key_doc:
+            return None
+
+        kek = unwrap_key(key_doc["wrapped_kek"], self.master_key)
+        with self.lock:
+            self.keys[client_name] = kek
+        return kek
+
+    def get_kek(self, client_name):
+        """Returns the client's key-encryption key, creating it on the client's first write."""
+        kek = self.find_kek(client_name)
+        if kek:
+            return kek
+
+        try:
+            # $setOnInsert keeps whichever key lands first if several workers create one at once
+            get_key_ring_db().client_keys.update_one(
+                {"_id": client_name},
+                {"$setOnInsert": {
+                    "wrapped_kek": wrap_key(generate_key(), self.master_key),
+                    "created_at": datetime.now(timezone.utc).isoformat()
+                }},
+                upsert=True
+            )
+            logger.info(f"Created key-encryption key for client '{client_name}'")
+        except DuplicateKeyError:
+            pass
+        return self.find_kek(client_name)
+
+def check_master_key(master_key):
+    """Raises a RuntimeError explaining the problem unless the master key is a base64 AES-128/192/256 key."""
+    if not master_key:
+        raise RuntimeError("KEYRING_MASTER_KEY must be set to a base64-encoded 16, 24 or 32 byte AES key")
+    try:
+        key_bytes = b64decode(master_key, validate=True)
+    except binascii.Error:
+        raise RuntimeError("KEYRING_MASTER_KEY is not valid base64")
+    if len(key_bytes) not in (16, 24, 32):
+        raise RuntimeError(f"KEYRING_MASTER_KEY decodes to {len(key_bytes)} bytes, expected 16, 24 or 32")
+
+keyring = KeyRing(KEYRING_MASTER_KEY)
+
+class TokenBucket:
+    """Allows bursts of up to `capacity` requests, refilled at `refill_rate` tokens per second."""
+
+    def __init__(self, capacity, refill_rate):
+        self.capacity = capacity
+        self.refill_rate = refill_rate
+        self.tokens = capacity
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def consume(self, tokens=1):
+        """Takes `tokens` tokens if available. Returns (allowed, seconds until enough tokens have refilled)."""
+        with self.lock:
+            now = time.monotonic()
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.refill_rate)
+            self.updated = now
+            if self.tokens >= tokens:
+                self.tokens -= tokens
+                return True, 0
+            return False, (tokens - self.tokens) / self.refill_rate
+
+class RateLimiter:
+    """Per-API-key token buckets, held in worker memory or in MongoDB so all workers share them."""
+
+    def __init__(self, capacity, refill_rate, backend="memory"):
+        self.capacity = capacity
+        self.refill_rate = refill_rate
+        self.backend = backend
+        self.buckets = {}
+        self.lock = threading.Lock()
+
+    def consume(self, api_key, tokens=1):
+        if self.backend == "mongo":
+            return self.consume_shared(api_key, tokens)
+        with self.lock:
+            bucket = self.buckets.get(api_key)
+            if bucket is None:
+                bucket = self.buckets[api_key] = TokenBucket(self.capacity, self.refill_rate)
+        return bucket.consume(tokens)
+
+    def consume_shared(self, api_key, tokens=1):
+        # Refill and take a token in a single atomic pipeline update (MongoDB 4.2+), so concurrent
+        # workers can never both take the last token
+        now = datetime.now(timezone.utc)
+        refilled = {"$min": [
+            self.capacity,
+            {"$add": [
+                {"$ifNull": ["$tokens", self.capacity]},
+                {"$multiply": [
+                    {"$subtract": [now, {"$ifNull": ["$updated", now]}]},
+                    self.refill_rate / 1000  # Date subtraction yields milliseconds
+                ]}
+            ]}
+        ]}
+        try:
+            bucket = get_db().Rate_Limits.find_one_and_update(
+                {"_id": api_key},
+                [
+                    {"$set": {"tokens": refilled, "updated": now}},
+                    {"$set": {"allowed": {"$gte": ["$tokens", tokens]}}},
+                    {"$set": {"tokens": {"$cond": ["$allowed", {"$subtract": ["$tokens", tokens]}, "$tokens"]}}}
+                ],
+                upsert=True,
+                return_document=ReturnDocument.AFTER
+            )
+        except Exception as e:
+            # Fail open, an unavailable rate limit store must not take the API down with it
+            logger.error(f"Shared rate limit store unavailable: {e}")
+            return True, 0
+        if bucket["allowed"]:
+            return True, 0
+        return False, (tokens - bucket["tokens"]) / self.refill_rate
+
+rate_limiter = RateLimiter(RATE_LIMIT_BURST, RATE_LIMIT_PER_MINUTE / 60, RATE_LIMIT_BACKEND)
+
+@bp.route('/setup', methods=['GET'])
 @validate_api_key(permission_required='setup')
 def setup():
     username = request.args.get('username')
@@ -222,7 +551,7 @@ def setup():
         return jsonify({"error": "Username is required"}), 400
     
     # Find the correct document that stores the "clients" array
-    client_document = db.Customer_API_Keys.find_one({"clients.client_name": username})
+    client_document = get_db().Customer_API_Keys.find_one({"clients.client_name": username})
     
     if not client_document:
         # If the client doesn't exist, create a new entry in the "clients" array
@@ -242,7 +571,7 @@ def setup():
         return jsonify({"error": "Client already exists"}), 400
 
     # Generate API keys and keys for domains
-    collection = customerDB[username]
+    collection = get_customer_db()[username]
     document = collection.find_one()
     
     if not document:
@@ -287,7 +616,7 @@ def setup():
     client_document["clients"].append(new_client)
     
     # Update the document in MongoDB
-    db.Customer_API_Keys.update_one(
+    get_db().Customer_API_Keys.update_one(
         {"_id": client_document["_id"]}, 
         {"$set": {"clients": client_document["clients"]}},
         upsert=True
@@ -302,7 +631,7 @@ def fetch_weather_openweather(lat, lon):
         "appid": OPENWEATHER_API_KEY,
         "units": "metric"
     }
-    response = requests.get(OPENWEATHER_API_URL, params=params)
+    response = http_session.get().get(OPENWEATHER_API_URL, params=params, timeout=PROVIDER_TIMEOUT)
     if response.status_code == 200:
         data = response.json()
         simplified_data = {
@@ -325,7 +654,7 @@ def fetch_weather_tomorrowio(lat, lon):
         "apikey": TOMORROWIO_API_KEY,
         "units": "metric"
     }
-    response = requests.get(TOMORROWIO_API_URL, params=params)
+    response = http_session.get().get(TOMORROWIO_API_URL, params=params, timeout=PROVIDER_TIMEOUT)
     if response.status_code == 200:
         data = response.json()
         simplified_data = {
@@ -348,7 +677,7 @@ def fetch_weather_visualcrossing(lat, lon):
         "key": VISUALCROSSING_API_KEY,
         "unitGroup": "metric"
     }
-    response = requests.get(VISUALCROSSING_API_URL, params=params)
+    response = http_session.get().get(VISUALCROSSING_API_URL, params=params, timeout=PROVIDER_TIMEOUT)
     if response.status_code == 200:
         data = response.json()
         day = data['days'][0]
@@ -365,33 +694,212 @@ def fetch_weather_visualcrossing(lat, lon):
     else:
         logger.error(f"VisualCrossing API request failed with status code {response.status_code}")
         return None
-    
-def fetch_and_store_weather(capital=None, client_name=None):
+
+WEATHER_PROVIDERS = {
+    "openweather": fetch_weather_openweather,
+    "tomorrowio": fetch_weather_tomorrowio,
+    "visualcrossing": fetch_weather_visualcrossing
+}
+
+provider_breakers = {
+    name: CircuitBreaker(name, CIRCUIT_BREAKER_THRESHOLD, CIRCUIT_BREAKER_RESET_TIMEOUT)
+    for name in WEATHER_PROVIDERS
+}
+
+# Number of provider calls submitted and not yet finished in this worker, queued ones included,
+# used for admission control
+provider_calls_in_flight = 0
+provider_calls_lock = threading.Lock()
+
+def provider_call_finished(future):
+    global provider_calls_in_flight
+    with provider_calls_lock:
+        provider_calls_in_flight -= 1
+
+def submit_provider_call(executor, fetcher, lat, lon):
+    global provider_calls_in_flight
+    with provider_calls_lock:
+        provider_calls_in_flight += 1
+    future = executor.submit(fetcher, lat, lon)
+    future.add_done_callback(provider_call_finished)
+    return future
+
+def shed_load(f):
+    """Rejects requests that would call the providers while too many provider calls are already in flight."""
+    @wraps(f)
+    def decorated_function(*args, **kwargs):
+        if provider_calls_in_flight >= MAX_INFLIGHT_PROVIDER_CALLS:
+            logger.warning(f"Shedding load, {provider_calls_in_flight} provider calls in flight")
+            response = jsonify({"error": "Service overloaded, try again later"})
+            response.headers['Retry-After'] = str(LOAD_SHED_RETRY_AFTER)
+            return response, 503
+        return f(*args, **kwargs)
+    return decorated_function
+
+def find_quorum(results):
+    """
+    Returns the readings to aggregate once every field has two providers agreeing on it, or None.
+
+    Fields are compared one at a time, like check_weather_data_consistency does. With only two readings
+    in hand that still means they must agree on every field, so a single disagreeing field (cloudCover
+    often does) means waiting for the third provider, whose outlier check then settles it.
+    """
+    settled = set()
+    for data1, data2 in combinations(results.values(), 2):
+        settled |= agreeing_fields(data1, data2)
+    if settled != set(CONSISTENCY_FIELDS):
+        return None
+    return results
+
+def settle_abandoned_attempts(name, futures, deadline):
+    """
+    Updates a provider's circuit once the attempts nobody waits for anymore have finished, so a
+    provider that is always too slow for the quorum still opens its circuit eventually.
+    """
+    state = {"remaining": len(futures), "answered": False}
+    lock = threading.Lock()
+
+    def on_done(future):
+        answered = (not future.cancelled() and future.exception() is None
+                    and bool(future.result()) and time.monotonic() <= deadline)
+        with lock:
+            state["remaining"] -= 1
+            state["answered"] = state["answered"] or answered
+            if state["remaining"]:
+                return
+        if state["answered"]:
+            provider_breakers[name].record_success()
+        else:
+            logger.warning(f"Provider '{name}' did not answer within {PROVIDER_TIMEOUT}s")
+            provider_breakers[name].record_failure()
+
+    for future in futures:
+        future.add_done_callback(on_done)
+
+def collect_weather_data(lat, lon):
+    """
+    Queries all providers concurrently and returns the readings to aggregate, keyed by provider name.
+
+    In quorum mode this returns as soon as find_quorum is satisfied, otherwise it waits for every provider.
+    Providers with an open circuit are skipped, and providers slower than PROVIDER_HEDGE_DELAY get a
+    second, hedged request whose result is used if it arrives first. Returns None if not enough
+    providers answered.
+    """
+    # A pool per aggregation, with room for one call and one hedged call per provider. Calls left
+    # running after a quorum only tie up their own pool, never another request's, and since every
+    # call gets a thread straight away, `started` is when a call really started
+    executor = ThreadPoolExecutor(max_workers=len(WEATHER_PROVIDERS) * 2, thread_name_prefix="provider")
+    pending = {}
+    started = {}
+    hedged = set()
+    failed = set()
+    results = {}
+
+    for name, fetcher in WEATHER_PROVIDERS.items():
+        if not provider_breakers[name].allow_request():
+            logger.warning(f"Skipping provider '{name}', circuit is open")
+            failed.add(name)
+            continue
+        pending[submit_provider_call(executor, fetcher, lat, lon)] = name
+        started[name] = time.monotonic()
+
+    deadline = time.monotonic() + PROVIDER_TIMEOUT
+
+    while pending:
+        now = time.monotonic()
+        if now >= deadline:
+            break
+
+        wait_time = deadline - now
+        if PROVIDER_HEDGE_DELAY > 0:
+            unhedged = [started[name] + PROVIDER_HEDGE_DELAY - now for name in set(pending.values()) if name not in hedged]
+            if unhedged:
+                wait_time = max(0, min([wait_time] + unhedged))
+
+        done, _ = wait(pending, timeout=wait_time, return_when=FIRST_COMPLETED)
+
+        for future in done:
+            name = pending.pop(future)
+            if name in results:
+                continue  # The other attempt for this provider already answered
+
+            try:
+                data = future.result()
+            except Exception as e:
+                logger.error(f"Provider '{name}' request failed: {e}")
+                data = None
+
+            if data:
+                results[name] = data
+                provider_breakers[name].record_success()
+                # Drop the outstanding attempt, if any, for a provider that already answered
+                for other_future, other_name in list(pending.items()):
+                    if other_name == name:
+                        other_future.cancel()
+                        del pending[other_future]
+            elif name not in pending.values():
+                failed.add(name)
+                provider_breakers[name].record_failure()
+
+        if WEATHER_QUORUM_MODE:
+            if len(results) == len(WEATHER_PROVIDERS):
+                break  # Everyone answered, keep all readings for the outlier check
+            if find_quorum(results):
+                logger.info(f"Quorum reached with providers {list(results.keys())}")
+                break
+            if len(results) + len(set(pending.values())) < 2:
+                break  # A quorum can no longer be reached
+        elif failed:
+            break  # Every provider is required outside quorum mode
+
+        if PROVIDER_HEDGE_DELAY > 0:
+            now = time.monotonic()
+            for name in set(pending.values()):
+                if name not in hedged and now - started[name] >= PROVIDER_HEDGE_DELAY:
+                    logger.info(f"Provider '{name}' slower than {PROVIDER_HEDGE_DELAY}s, sending hedged request")
+                    pending[submit_provider_call(executor, WEATHER_PROVIDERS[name], lat, lon)] = name
+                    hedged.add(name)
+
+    # Leave anything still outstanding to finish in the background, and judge it against the deadline then
+    abandoned = {}
+    for future, name in pending.items():
+        abandoned.setdefault(name, []).append(future)
+    for name, futures in abandoned.items():
+        settle_abandoned_attempts(name, futures, deadline)
+    executor.shutdown(wait=False)
+
+    if WEATHER_QUORUM_MODE:
+        if len(results) == len(WEATHER_PROVIDERS) or find_quorum(results):
+            return results
+    elif not failed and len(results) == len(WEATHER_PROVIDERS):
+        return results
+
+    logger.error(f"Not enough weather providers answered, got {list(results.keys())}")
+    return None
+
+def build_weather_record(capital, client_name):
+    """Fetches, aggregates and encrypts the weather for a capital. Returns (record, averages, recorded_at) or None."""
 
     if capital:
         capital = capital.strip().lower()
-        location = capitals_data.get(capital)
+        location = get_capitals_data().get(capital)
         if not location:
             logger.error(f"Capital '{capital}' not found")
-            return False
+            return None
         lat, lon = location
         logger.info(f"Capital '{capital}' found with coordinates: {lat}, {lon}")
     else:
         logger.error("No capital provided")
-        return False
+        return None
 
-    weather_data_openweather = fetch_weather_openweather(lat, lon)
-    weather_data_tomorrowio = fetch_weather_tomorrowio(lat, lon)
-    weather_data_visualcrossing = fetch_weather_visualcrossing(lat, lon)
+    provider_data = collect_weather_data(lat, lon)
 
-    if not weather_data_openweather or not weather_data_tomorrowio or not weather_data_visualcrossing:
-        logger.error("Failed to fetch weather data from one or more APIs")
-        return False
+    if not provider_data:
+        logger.error("Failed to fetch weather data from enough APIs")
+        return None
 
     weather_data = {
-        "openweather": weather_data_openweather,
-        "tomorrowio": weather_data_tomorrowio,
-        "visualcrossing": weather_data_visualcrossing,
+        **provider_data,
         "timestamp": datetime.now(timezone.utc).isoformat()
     }
     logger.info(f"Fetched weather data: {weather_data}")
@@ -406,84 +914,249 @@ def fetch_and_store_weather(capital=None, client_name=None):
     averages_json = json.dumps(averages, sort_keys=True, separators=(',', ':'))
     logger.info(f"Serialized averages JSON: {averages_json}")
 
-    # Hash the serialized JSON string
-    data_hash = get_hashed_data(averages_json)
-    logger.info(f"Computed hash for serialized data: {data_hash}")
-    
-    # Encrypt the weather data using the transit key
-    transit_key = generate_key()
-    encrypted_data = encrypt_data(averages_json, transit_key)
-    logger.info(f"Encrypted weather data: {encrypted_data}")
-
-    # Insert the weather record and get the inserted ID
-    user_db = client.get_database('Weather_Record')
-    user_collection = user_db[f'{client_name}_Data']
-
-    record = {
-        "data": encrypted_data,
-        "hash": data_hash,
-        "timestamp": datetime.now(timezone.utc).isoformat()
-    }
-    logger.info(f"Record to be inserted: {record}")
+    # Encrypt the serialized weather data using a fresh data key. The GCM tag authenticates
+    # the ciphertext, so no separate hash is stored
+    data_key = generate_key()
+    encrypted_data = encrypt_bytes(averages_json.encode('utf-8'), data_key)
+    logger.info(f"Encrypted weather data ({len(encrypted_data)} bytes)")
 
+    # Wrap the data key under the client's key-encryption key so it can be stored inline with the record
     try:
-        result_record = user_collection.insert_one(record)
-        logger.info(f"Inserted record ID: {result_record.inserted_id}")
+        wrapped_key = wrap_key(data_key, keyring.get_kek(client_name))
     except Exception as e:
-        logger.error(f"Error inserting record into user's collection: {e}")
-        return False
+        logger.error(f"Error wrapping data key for client '{client_name}': {e}")
+        return None
 
-    # Store the transit key linked with the weather record ID
-    transit_key_collection = transit_key_db[f"{client_name}_transitKeys"]
-    transit_key_doc = {
-        "weather_record_id": result_record.inserted_id,
-        "client_name": client_name,
-        "key": transit_key  # Store the transit key directly without encryption
+    recorded_at = datetime.now(timezone.utc)
+    record = {
+        "v": RECORD_FORMAT_VERSION,
+        "data": encrypted_data,  # Stored as BSON binary
+        "key": wrapped_key,  # Stored as BSON binary
+        "timestamp": recorded_at.isoformat()
     }
-    transit_key_collection.insert_one(transit_key_doc)
-    logger.info(f"Stored transit key for weather record ID {result_record.inserted_id} in Transit_Key database")
+    return record, averages, recorded_at
 
-    domain_docs = customerDB[client_name].find_one()
+def load_domain_signers(client_name):
+    """Returns a SimpleSigner holding the key pair of each of the client's domains, or None if any key is missing."""
+    domain_docs = get_customer_db()[client_name].find_one()
     if not domain_docs:
         logger.error(f"No domain documents found for client '{client_name}'")
-        return False
+        return None
     
     domains = domain_docs.get('domain', {}).keys()
     if not domains:
         logger.error(f"No domains found in domain documents for client '{client_name}'")
-        return False
+        return None
+
+    signers = []
+    for domain in domains:
+        signer = SimpleSigner(domain)
+        pri_key = domain_docs.get(f'pri_{domain}_PEM')
+        pub_key = domain_docs.get(f'pub_{domain}_PEM')
+
+        if not pri_key or not pub_key:
+            logger.error(f"Private or public key not found for domain '{domain}'")
+            return None
+
+        signer.key = RSA.import_key(pri_key.encode())
+        signer.public_key = RSA.import_key(pub_key.encode())
+        signers.append(signer)
+    return signers
+
+def sign_with_domains(client_name, data):
+    """Signs data with every domain of the client. Returns the verified aggregate signature, or None."""
+    try:
+        signers = load_domain_signers(client_name)
+        if not signers:
+            return None
+
+        signatures = [signer.sign(data) for signer in signers]
+        agg_sig = SimpleSigner.aggregate_signatures(signatures)
+        logger.info(f"Aggregate signature created")
+
+        is_valid = SimpleSigner.verify_aggregate(
+            [signer.identity for signer in signers], data, agg_sig, [signer.public_key for signer in signers]
+        )
+        logger.info(f"Aggregate signature valid: {is_valid}")
+
+    except (ValueError, TypeError) as e:
+        logger.error(f"Error in key processing or verification: {e}")
+        return None
+
+    return agg_sig if is_valid else None
+
+def sign_batch(client_name, data_items):
+    """
+    Hashes the given ciphertexts into a Merkle tree and has every domain sign only its root.
+    Stores the batch and returns (batch, proofs), with one inclusion proof per item, or (None, None).
+    """
+    leaves = [merkle_leaf_hash(data) for data in data_items]
+    root, proofs = build_merkle_tree(leaves)
+
+    agg_sig = sign_with_domains(client_name, root)
+    if agg_sig is None:
+        return None, None
+
+    batch = {
+        "root": root,  # Stored as BSON binary
+        "agg_sig": agg_sig,  # Stored as BSON binary
+        "size": len(leaves),
+        "created_at": datetime.now(timezone.utc).isoformat()
+    }
+    try:
+        get_weather_record_db()[f'{client_name}_Batches'].insert_one(batch)
+        logger.info(f"Signed batch {batch['_id']} of {len(leaves)} records for client '{client_name}'")
+    except Exception as e:
+        logger.error(f"Error inserting signature batch: {e}")
+        return None, None
+    return batch, proofs
+
+class SignatureBatcher:
+    """
+    Collects the records each client writes within a window and signs them as one Merkle batch.
+
+    The first writer in a window waits for it to close, signs the batch and attaches the inclusion
+    proofs, while later writers in the same window wait for the outcome.
+    """
+
+    def __init__(self, window):
+        self.window = window
+        self.open_batches = {}
+        self.lock = threading.Lock()
+
+    def add(self, client_name, record_id, data):
+        with self.lock:
+            batch = self.open_batches.get(client_name)
+            is_leader = batch is None
+            if is_leader:
+                batch = {"records": [], "signed": False, "done": threading.Event()}
+                self.open_batches[client_name] = batch
+            batch["records"].append((record_id, data))
+
+        if not is_leader:
+            batch["done"].wait()
+            return batch["signed"]
+
+        try:
+            time.sleep(self.window)
+            with self.lock:
+                del self.open_batches[client_name]
+            batch["signed"] = self.seal(client_name, batch["records"])
+        finally:
+            batch["done"].set()
+        return batch["signed"]
+
+    def seal(self, client_name, records):
+        signed_batch, proofs = sign_batch(client_name, [data for _, data in records])
+        if not signed_batch:
+            return False
+
+        updates = [
+            UpdateOne(
+                {"_id": record_id},
+                {"$set": {"batch_id": signed_batch["_id"], "leaf_index": index, "proof": proof}}
+            )
+            for index, ((record_id, _), proof) in enumerate(zip(records, proofs))
+        ]
+        try:
+            get_weather_record_db()[f'{client_name}_Data'].bulk_write(updates, ordered=False)
+        except Exception as e:
+            logger.error(f"Error updating records with batch inclusion proofs: {e}")
+            return False
+        return True
+
+signature_batcher = SignatureBatcher(BATCH_SIGNING_WINDOW)
+
+def load_domain_public_keys(client_name):
+    """Returns (identities, public keys) of the client's domains, or None if any key is missing. Verification never needs the private keys."""
+    domain_docs = get_customer_db()[client_name].find_one()
+    if not domain_docs or not domain_docs.get('domain'):
+        logger.error(f"No domains found for client '{client_name}'")
+        return None
 
     identities = []
-    signatures = []
     public_keys = []
-    is_valid = False
+    for domain in domain_docs['domain'].keys():
+        pub_key = domain_docs.get(f'pub_{domain}_PEM')
+        if not pub_key:
+            logger.error(f"Public key not found for domain '{domain}'")
+            return None
+        identities.append(domain)
+        public_keys.append(RSA.import_key(pub_key.encode()))
+    return identities, public_keys
+
+def verify_domain_signature(client_name, data, agg_sig):
+    try:
+        domain_keys = load_domain_public_keys(client_name)
+        if not domain_keys:
+            return False
+        identities, public_keys = domain_keys
+        return SimpleSigner.verify_aggregate(identities, data, agg_sig, public_keys)
+    except (ValueError, TypeError) as e:
+        logger.error(f"Error in key processing or verification: {e}")
+        return False
+
+def verify_batched_record(client_name, record):
+    """Checks a single batch-signed record: its proof must lead to the batch root and every domain must have signed that root."""
+    batch = get_weather_record_db()[f'{client_name}_Batches'].find_one({"_id": record.get("batch_id")})
+    if not batch:
+        logger.error(f"No signature batch found for record ID {record['_id']}")
+        return False
+
+    if not verify_merkle_proof(merkle_leaf_hash(record["data"]), record["leaf_index"], batch["size"], record["proof"], batch["root"]):
+        logger.error(f"Inclusion proof invalid for record ID {record['_id']}")
+        return False
+
+    return verify_domain_signature(client_name, batch["root"], batch["agg_sig"])
 
+def verify_record_signature(client_name, record):
+    """Checks the signature of a stored record, whether it was signed on its own or as part of a batch."""
+    if "batch_id" in record:
+        return verify_batched_record(client_name, record)
+    if "agg_sig" not in record:
+        logger.error(f"Record ID {record['_id']} is not signed")
+        return False
+    if record.get("v") in (RECORD_FORMAT_VERSION, COMPACT_RECORD_FORMAT_VERSION):
+        return verify_domain_signature(client_name, record["data"], record["agg_sig"])
+    # Legacy records were signed over their base64 ciphertext and store the signature hex-encoded
     try:
-        for domain in domains:
-            signer = SimpleSigner(domain)
-            pri_key = domain_docs.get(f'pri_{domain}_PEM')
-            pub_key = domain_docs.get(f'pub_{domain}_PEM')
+        agg_sig = bytes.fromhex(record["agg_sig"])
+    except (ValueError, TypeError) as e:
+        logger.error(f"Malformed signature on record ID {record['_id']}: {e}")
+        return False
+    return verify_domain_signature(client_name, record["data"].encode(), agg_sig)
 
-            if not pri_key or not pub_key:
-                logger.error(f"Private or public key not found for domain '{domain}'")
-                return False
+def fetch_and_store_weather(capital=None, client_name=None):
 
-            signer.key = RSA.import_key(pri_key.encode())
-            signer.public_key = RSA.import_key(pub_key.encode())
+    built = build_weather_record(capital, client_name)
+    if not built:
+        return False
+    record, averages, recorded_at = built
 
-            signature = signer.sign(encrypted_data.encode())
-            signatures.append(signature)
-            identities.append(domain)
-            public_keys.append(signer.public_key)
+    # Insert the weather record and get the inserted ID
+    user_db = get_weather_record_db()
+    user_collection = user_db[f'{client_name}_Data']
+    logger.info(f"Record to be inserted: {record}")
 
-        agg_sig = SimpleSigner.aggregate_signatures(signatures)
-        logger.info(f"Aggregate signature created")
+    try:
+        result_record = user_collection.insert_one(record)
+        logger.info(f"Inserted record ID: {result_record.inserted_id}")
+    except Exception as e:
+        logger.error(f"Error inserting record into user's collection: {e}")
+        return False
 
-        is_valid = SimpleSigner.verify_aggregate(identities, encrypted_data.encode(), agg_sig, public_keys)
-        logger.info(f"Aggregate signature valid: {is_valid}")
+    # Rolled up whether or not signing succeeds, the record is stored and served in the raw history either way
+    update_rollups(client_name, [result_record.inserted_id], [(averages, recorded_at)])
+
+    if SIGNING_MODE == "batch":
+        # Sign together with the other records written in this window
+        is_valid = signature_batcher.add(client_name, result_record.inserted_id, record["data"])
+    else:
+        agg_sig = sign_with_domains(client_name, record["data"])
+        is_valid = agg_sig is not None
 
         if is_valid:
-            record["agg_sig"] = agg_sig.hex()
+            record["agg_sig"] = agg_sig  # Stored as BSON binary
             try:
                 user_collection.update_one(
                     {"_id": result_record.inserted_id},
@@ -494,38 +1167,390 @@ def fetch_and_store_weather(capital=None, client_name=None):
                 logger.error(f"Error updating record with aggregate signature: {e}")
                 return False
 
-    except (ValueError, TypeError) as e:
-        logger.error(f"Error in key processing or verification: {e}")
-        is_valid = False
-
     return is_valid
 
-def increment_requests_made(api_key):
+def fetch_and_store_weather_bulk(capitals, client_name):
+    """Fetches and stores the weather for several capitals as one batch signed under a single Merkle root."""
+    executor = ThreadPoolExecutor(max_workers=BULK_INGEST_CONCURRENCY)
+    futures = {capital: executor.submit(build_weather_record, capital, client_name) for capital in capitals}
+    wait(futures.values(), timeout=BULK_INGEST_DEADLINE)
+    # Capitals still being fetched at the deadline are reported as failed, not waited for
+    executor.shutdown(wait=False, cancel_futures=True)
+
+    built_records = []
+    failed = []
+    for capital, future in futures.items():
+        built = None
+        if future.done() and not future.cancelled():
+            try:
+                built = future.result()
+            except Exception as e:
+                logger.error(f"Error building weather record for '{capital}': {e}")
+        else:
+            logger.warning(f"Weather for '{capital}' not fetched within the bulk ingest deadline")
+        if built:
+            built_records.append((capital, *built))
+        else:
+            failed.append(capital)
+
+    if not built_records:
+        return None, [], failed
+
+    signed_batch, proofs = sign_batch(client_name, [record["data"] for _, record, _, _ in built_records])
+    if not signed_batch:
+        return None, [], capitals
+
+    for index, ((_, record, _, _), proof) in enumerate(zip(built_records, proofs)):
+        record.update({"batch_id": signed_batch["_id"], "leaf_index": index, "proof": proof})
+
+    try:
+        get_weather_record_db()[f'{client_name}_Data'].insert_many([record for _, record, _, _ in built_records])
+        logger.info(f"Inserted {len(built_records)} records in batch {signed_batch['_id']}")
+    except Exception as e:
+        logger.error(f"Error inserting batch records into user's collection: {e}")
+        return None, [], capitals
+
+    update_rollups(
+        client_name,
+        [record["_id"] for _, record, _, _ in built_records],
+        [(averages, recorded_at) for _, _, averages, recorded_at in built_records]
+    )
+
+    return signed_batch["_id"], [capital for capital, _, _, _ in built_records], failed
+
+# Rollup resolutions and how a timestamp is truncated to the start of its bucket
+ROLLUP_RESOLUTIONS = {
+    "hour": lambda ts: ts.replace(minute=0, second=0, microsecond=0),
+    "day": lambda ts: ts.replace(hour=0, minute=0, second=0, microsecond=0)
+}
+
+def rollup_id(resolution, bucket):
+    # Fixed-width UTC timestamps sort chronologically, so a resolution's rollups can be range-queried on _id
+    return f"{resolution}:{bucket.astimezone(timezone.utc).strftime('%Y-%m-%dT%H:%M:%SZ')}"
+
+def fold_reading(stats, averages):
+    stats["count"] += 1
+    for field, value in averages.items():
+        field_stats = stats["fields"].get(field)
+        if field_stats is None:
+            stats["fields"][field] = {"min": value, "max": value, "sum": value, "count": 1}
+        else:
+            field_stats["min"] = min(field_stats["min"], value)
+            field_stats["max"] = max(field_stats["max"], value)
+            field_stats["sum"] += value
+            field_stats["count"] += 1
+
+def encrypt_rollup(rollup_key, stats, kek):
+    # The bucket id goes inside the ciphertext so an encrypted rollup can't be passed off as another bucket's
+    return encrypt_bytes(json.dumps({"id": rollup_key, **stats}, separators=(',', ':')).encode('utf-8'), kek)
+
+def decrypt_rollup(rollup, kek):
+    stats = json.loads(decrypt_bytes(rollup["data"], kek))
+    if stats.pop("id") != rollup["_id"]:
+        raise ValueError(f"Rollup data does not belong to bucket {rollup['_id']}")
+    return stats
+
+def apply_rollup_readings(client_name, readings):
+    """
+    Folds (averages, recorded_at) readings into the client's hourly and daily rollups.
+
+    The min/max/sum aggregates are encrypted under the client's key-encryption key like the records
+    they summarize, so each bucket is a read-modify-write guarded by a version number. Only the bucket,
+    its reading count and the version are stored in plaintext. Raises if a bucket could not be written.
+    """
+    kek = keyring.get_kek(client_name)
+    rollup_collection = get_weather_record_db()[f'{client_name}_Rollups']
+
+    buckets = {}
+    for averages, recorded_at in readings:
+        for resolution, truncate in ROLLUP_RESOLUTIONS.items():
+            bucket = truncate(recorded_at)
+            buckets.setdefault(rollup_id(resolution, bucket), (resolution, bucket, []))[2].append(averages)
+
+    for rollup_key, (resolution, bucket, bucket_readings) in buckets.items():
+        for attempt in range(ROLLUP_UPDATE_RETRIES):
+            rollup = rollup_collection.find_one({"_id": rollup_key})
+            stats = decrypt_rollup(rollup, kek) if rollup else {"count": 0, "fields": {}}
+            for averages in bucket_readings:
+                fold_reading(stats, averages)
+            data = encrypt_rollup(rollup_key, stats, kek)
+
+            if rollup:
+                # Only replace the version that was read, so concurrent writers can't lose each other's readings
+                result = rollup_collection.update_one(
+                    {"_id": rollup_key, "version": rollup["version"]},
+                    {"$set": {"data": data, "count": stats["count"]}, "$inc": {"version": 1}}
+                )
+                if result.modified_count:
+                    break
+            else:
+                try:
+                    rollup_collection.insert_one({
+                        "_id": rollup_key,
+                        "resolution": resolution,
+                        "bucket": bucket.isoformat(),
+                        "count": stats["count"],
+                        "version": 1,
+                        "data": data  # Stored as BSON binary
+                    })
+                    break
+                except DuplicateKeyError:
+                    pass
+        else:
+            raise RuntimeError(f"Rollup {rollup_key} kept changing under concurrent writers")
+
+def update_rollups(client_name, record_ids, readings):
+    """Folds the readings of newly written records into the rollups and marks the records as rolled up."""
+    user_collection = get_weather_record_db()[f'{client_name}_Data']
+    try:
+        apply_rollup_readings(client_name, readings)
+    except Exception as e:
+        # Rollups are derived data, so a failure here must not fail the write of the records themselves.
+        # The records are left to the backfill instead
+        logger.error(f"Error updating rollups for client '{client_name}', leaving {len(record_ids)} records to the backfill: {e}")
+        try:
+            user_collection.update_many({"_id": {"$in": record_ids}}, {"$set": {"in_rollups": False}})
+            get_weather_record_db()[f'{client_name}_Rollups'].update_one({"_id": "backfill"}, {"$set": {"repair_needed": True}})
+        except Exception as e:
+            logger.error(f"Error flagging records for the rollup backfill: {e}")
+        return
+
+    try:
+        user_collection.update_many({"_id": {"$in": record_ids}}, {"$set": {"in_rollups": True}})
+    except Exception as e:
+        logger.error(f"Error marking records as rolled up, a later backfill may count them twice: {e}")
+
+def backfill_rollups(client_name):
+    """
+    Folds the client's records that are missing from the rollups into them: records written before
+    rollups existed, and records whose rollup update failed on the write path. A claim document makes
+    sure only one worker backfills at a time. Returns True once the rollups have been backfilled at least once.
+    """
+    rollup_collection = get_weather_record_db()[f'{client_name}_Rollups']
+    user_collection = get_weather_record_db()[f'{client_name}_Data']
+
+    state = rollup_collection.find_one({"_id": "backfill"})
+    if state and state["status"] == "done" and not state.get("repair_needed"):
+        return True
+
+    now = datetime.now(timezone.utc)
+    if not state:
+        try:
+            rollup_collection.insert_one({"_id": "backfill", "status": "running", "claimed_at": now, "repair_needed": False})
+        except DuplicateKeyError:
+            return False
+    elif state["status"] == "done":
+        # Repairs run while readers keep being served the rollups, which were already complete up to the failure
+        result = rollup_collection.update_one(
+            {"_id": "backfill", "status": "done", "repair_needed": True},
+            {"$set": {"status": "running", "claimed_at": now, "repair_needed": False}}
+        )
+        if not result.modified_count:
+            return True
+    else:
+        # Take over a claim whose worker stopped refreshing it
+        if now - state["claimed_at"].replace(tzinfo=timezone.utc) < timedelta(seconds=ROLLUP_BACKFILL_STALE_AFTER):
+            return state.get("backfilled", False)
+        result = rollup_collection.update_one(
+            {"_id": "backfill", "status": "running", "claimed_at": state["claimed_at"]},
+            {"$set": {"claimed_at": now}}
+        )
+        if not result.modified_count:
+            return state.get("backfilled", False)
+
+    # Records the write path failed to roll up are flagged False. Unflagged records are either from
+    # before rollups existed or still being written, so only those past the grace period are taken
+    cutoff = ObjectId.from_datetime(now - timedelta(seconds=ROLLUP_BACKFILL_GRACE))
+    missing = {"$or": [{"in_rollups": False}, {"in_rollups": {"$exists": False}, "_id": {"$lt": cutoff}}]}
+
+    logger.info(f"Backfilling rollups for client '{client_name}'")
+    backfilled = 0
+    while True:
+        records = list(user_collection.find(missing).sort("_id", 1).limit(ROLLUP_BACKFILL_CHUNK))
+        if not records:
+            break
+
+        readings = [
+            (json.loads(decrypted_data), datetime.fromisoformat(record["timestamp"]))
+            for record, decrypted_data in decrypt_records(client_name, records)
+        ]
+        if readings:
+            apply_rollup_readings(client_name, readings)
+        # Marked after folding, a crash in between counts that chunk twice rather than losing it
+        user_collection.update_many(
+            {"_id": {"$in": [record["_id"] for record in records]}},
+            {"$set": {"in_rollups": True}}
+        )
+        backfilled += len(readings)
+        rollup_collection.update_one({"_id": "backfill"}, {"$set": {"claimed_at": datetime.now(timezone.utc)}})
+
+    # A failure flagged while this ran leaves repair_needed set, so the next request runs the backfill again
+    rollup_collection.update_one({"_id": "backfill"}, {"$set": {"status": "done", "backfilled": True}})
+    logger.info(f"Backfilled {backfilled} records into rollups for client '{client_name}'")
+    return True
+
+def parse_history_bound(value):
+    """Parses an ISO 8601 start/end query parameter, treating naive timestamps as UTC."""
+    if not value:
+        return None
+    bound = datetime.fromisoformat(value)
+    if bound.tzinfo is None:
+        bound = bound.replace(tzinfo=timezone.utc)
+    return bound
+
+def rollup_history_response(client_name, resolution, start, end):
+    """Serves the client's rollups for a resolution, optionally limited to buckets in [start, end)."""
+    if not backfill_rollups(client_name):
+        logger.info(f"Rollups for client '{client_name}' are still being backfilled")
+        response = jsonify({"error": "Rollups are being backfilled, try again later"})
+        response.headers['Retry-After'] = str(LOAD_SHED_RETRY_AFTER)
+        return response, 503
+
+    rollup_collection = get_weather_record_db()[f'{client_name}_Rollups']
+    id_range = {
+        "$gte": rollup_id(resolution, start) if start else f"{resolution}:",
+        "$lt": rollup_id(resolution, end) if end else f"{resolution};"  # ';' sorts right after ':'
+    }
+    rollup_docs = list(rollup_collection.find({"_id": id_range}).sort("_id", 1))
+
+    # Reading counts only grow, so their sum over the range changes whenever any rollup in it does
+    etag = "-".join([
+        resolution,
+        start.isoformat() if start else "",
+        end.isoformat() if end else "",
+        str(len(rollup_docs)),
+        str(sum(rollup["count"] for rollup in rollup_docs))
+    ])
+    if request.if_none_match.contains_weak(etag):
+        logger.info(f"Rollups for client '{client_name}' unchanged, returning 304")
+        response = Response(status=304)
+        response.set_etag(etag, weak=True)
+        return response
+
+    rollups = []
+    kek = keyring.find_kek(client_name) if rollup_docs else None
+    for rollup in rollup_docs:
+        try:
+            stats = decrypt_rollup(rollup, kek)
+        except (ValueError, TypeError) as e:
+            logger.error(f"Could not decrypt rollup {rollup['_id']}: {e}")
+            continue
+        rollups.append({
+            "bucket": rollup["bucket"],
+            "count": stats["count"],
+            "fields": {
+                field: {
+                    "min": field_stats["min"],
+                    "max": field_stats["max"],
+                    "mean": round(field_stats["sum"] / field_stats["count"], 2)
+                }
+                for field, field_stats in stats["fields"].items()
+            }
+        })
+
+    logger.info(f"Returning {len(rollups)} {resolution} rollups for client '{client_name}'")
+    response = json_response({"resolution": resolution, "rollups": rollups})
+    response.set_etag(etag, weak=True)
+    response.headers['Cache-Control'] = 'private, no-cache'
+    return response
+
+def decrypt_records(client_name, records):
+    """Yields (record, decrypted JSON bytes) for each record that decrypts and passes its integrity check."""
+    # Records written before envelope encryption keep their keys in the Transit_Key database,
+    # fetch those in a single query
+    legacy_ids = [record["_id"] for record in records if record.get("v") != RECORD_FORMAT_VERSION]
+    transit_keys = {}
+    if legacy_ids:
+        transit_keys = {
+            transit_key_doc["weather_record_id"]: transit_key_doc["key"]
+            for transit_key_doc in get_transit_key_db()[f"{client_name}_transitKeys"].find(
+                {"weather_record_id": {"$in": legacy_ids}}
+            )
+        }
+
+    kek = None
+    kek_unavailable = False
+
+    for record in records:
+        logger.info(f"Fetched record ID {record['_id']} from MongoDB")
+
+        try:
+            if record.get("v") == RECORD_FORMAT_VERSION:
+                # Envelope records carry their data key wrapped under the client's key-encryption key
+                if kek is None and not kek_unavailable:
+                    try:
+                        kek = keyring.find_kek(client_name)
+                    except Exception as e:
+                        logger.error(f"Error loading key-encryption key for client '{client_name}': {e}")
+                    kek_unavailable = kek is None
+                if kek_unavailable:
+                    logger.error(f"No key-encryption key to unwrap the data key of record ID {record['_id']}")
+                    continue
+                data_key = unwrap_key(record["key"], kek)
+            else:
+                data_key = transit_keys.get(record["_id"])
+                if not data_key:
+                    logger.error(f"No transit key found for record ID {record['_id']}")
+                    continue
+
+            # Use the data key to decrypt the weather data
+            if record.get("v") in (RECORD_FORMAT_VERSION, COMPACT_RECORD_FORMAT_VERSION):
+                # Compact records carry raw ciphertext, authenticated by the GCM tag
+                decrypted_data = decrypt_bytes(record["data"], data_key)
+            else:
+                # Legacy records carry base64 ciphertext of a double-encoded JSON string and a separate hash
+                decrypted_data = decrypt_data(record["data"], data_key)
+
+                # **Instead of re-serializing, compare the already serialized JSON string directly**
+                # Check the hash of the decrypted data
+                if not check_hash(decrypted_data, record["hash"]):
+                    logger.error(f"Data integrity check failed for record ID {record['_id']} and data {decrypted_data}")
+                    continue
+        except ValueError as e:
+            logger.error(f"Data integrity check failed for record ID {record['_id']}: {e}")
+            continue
+
+        logger.info(f"Data integrity check passed for record ID {record['_id']}")
+        yield record, decrypted_data
+
+def increment_requests_made(api_key, count=1):
     """Increments the 'requests_made' field for the client associated with the API key."""
     try:
-        db.Customer_API_Keys.update_one(
+        get_db().Customer_API_Keys.update_one(
             {"clients.api_key": api_key},
-            {"$inc": {"clients.$.requests_made": 1}}
+            {"$inc": {"clients.$.requests_made": count}}
         )
         logger.info(f"Incremented requests_made for API key: {api_key}")
     except Exception as e:
         logger.error(f"Failed to increment requests_made: {e}")
 
-@app.route('/get-historical-data', methods=['GET'])
+@bp.route('/get-historical-data', methods=['GET'])
 @validate_api_key(permission_required='get-historical-data')
 def get_historical_data():
     try:
         api_key = request.args.get('apikey', None)
+        resolution = request.args.get('resolution', None)
         
         if not api_key:
             logger.error("API key is required")
             return jsonify({"error": "API key is required"}), 400
 
+        if resolution and resolution not in ROLLUP_RESOLUTIONS:
+            logger.error(f"Unsupported resolution '{resolution}'")
+            return jsonify({"error": f"Resolution must be one of {list(ROLLUP_RESOLUTIONS.keys())}"}), 400
+
+        try:
+            start = parse_history_bound(request.args.get('start', None))
+            end = parse_history_bound(request.args.get('end', None))
+        except ValueError:
+            logger.error("Invalid start or end timestamp")
+            return jsonify({"error": "start and end must be ISO 8601 timestamps"}), 400
+
         # Increment the requests_made counter
         increment_requests_made(api_key)
 
         # Look up the client_name associated with the given API key
-        client_document = db.Customer_API_Keys.find_one({"clients.api_key": api_key})
+        client_document = get_db().Customer_API_Keys.find_one({"clients.api_key": api_key})
         if not client_document:
             logger.error("Invalid API key provided")
             return jsonify({"error": "Invalid API key"}), 401
@@ -537,10 +1562,30 @@ def get_historical_data():
 
         client_name = client_info['client_name']
 
+        if resolution:
+            # Serve the precomputed aggregates instead of decrypting every raw record
+            return rollup_history_response(client_name, resolution, start, end)
+
         # Retrieve the weather data collection for the client
-        user_db = client.get_database('Weather_Record')
+        user_db = get_weather_record_db()
         user_collection = user_db[f'{client_name}_Data']
 
+        # Derive the ETag from the latest record and the record count, so an unchanged history
+        # can be answered with 304 before any record is fetched or decrypted
+        record_count = user_collection.count_documents({})
+        latest_record = user_collection.find_one(sort=[("_id", -1)], projection={"_id": 1})
+
+        if not record_count or not latest_record:
+            logger.info(f"No records found for client '{client_name}'")
+            return jsonify({"error": "No historical data found"}), 404
+
+        etag = f"{latest_record['_id']}-{record_count}"
+        if request.if_none_match.contains_weak(etag):
+            logger.info(f"Historical data for client '{client_name}' unchanged, returning 304")
+            response = Response(status=304)
+            response.set_etag(etag, weak=True)
+            return response
+
         # Fetch all records for the client
         records = list(user_collection.find())
 
@@ -550,32 +1595,7 @@ def get_historical_data():
 
         historical_data = []
 
-        for record in records:
-            logger.info(f"Fetched record from MongoDB: {record}")
-
-            # Retrieve the transit key from the database
-            transit_key_doc = transit_key_db[f"{client_name}_transitKeys"].find_one(
-                {"weather_record_id": record["_id"]}
-            )
-            if not transit_key_doc:
-                logger.error(f"No transit key found for record ID {record['_id']}")
-                continue
-
-            transit_key = transit_key_doc["key"]
-            logger.info(f"Retrieved transit key: {transit_key}")
-
-            # Use the transit key to decrypt the weather data
-            decrypted_data = decrypt_data(record["data"], transit_key)
-            logger.info(f"Decrypted weather data: {decrypted_data}")
-
-            # **Instead of re-serializing, compare the already serialized JSON string directly**
-            # Check the hash of the decrypted data
-            if not check_hash(decrypted_data, record["hash"]):
-                logger.error(f"Data integrity check failed for record ID {record['_id']} and data {decrypted_data}")
-                continue
-
-            logger.info(f"Data integrity check passed for record ID {record['_id']}")
-
+        for record, decrypted_data in decrypt_records(client_name, records):
             # Append the decrypted and verified data to the historical data list
             historical_data.append({
                 "decrypted_data": json.loads(decrypted_data),  # Load it back into a dictionary for the response
@@ -587,13 +1607,57 @@ def get_historical_data():
             logger.info(f"All records for client '{client_name}' failed integrity checks or no valid data found")
             return jsonify({"error": "No valid historical data found"}), 500
 
-        return jsonify({"historical_data": historical_data}), 200
+        response = json_response({"historical_data": historical_data})
+        response.set_etag(etag, weak=True)
+        response.headers['Cache-Control'] = 'private, no-cache'
+        return response
+
+    except Exception as e:
+        logger.exception("Exception occurred")
+        return jsonify({"error": "Internal Server Error"}), 500
+
+@bp.route('/verify-record', methods=['GET'])
+@validate_api_key(permission_required='get-historical-data')
+def verify_record():
+    try:
+        api_key = request.args.get('apikey', None)
+        record_id = request.args.get('record_id', None)
+
+        if not record_id or not ObjectId.is_valid(record_id):
+            logger.error("Invalid or missing record ID")
+            return jsonify({"error": "A valid record_id is required"}), 400
+
+        # Increment the requests_made counter
+        increment_requests_made(api_key)
+
+        # Look up the client_name associated with the given API key
+        client_document = get_db().Customer_API_Keys.find_one({"clients.api_key": api_key})
+        if not client_document:
+            logger.error("Invalid API key provided")
+            return jsonify({"error": "Invalid API key"}), 401
+
+        client_info = next((client for client in client_document['clients'] if client['api_key'] == api_key), None)
+        if not client_info:
+            logger.error("Client not found for the provided API key")
+            return jsonify({"error": "Client not found"}), 401
+
+        client_name = client_info['client_name']
+
+        record = get_weather_record_db()[f'{client_name}_Data'].find_one({"_id": ObjectId(record_id)})
+        if not record:
+            logger.error(f"Record ID {record_id} not found for client '{client_name}'")
+            return jsonify({"error": "Record not found"}), 404
+
+        is_valid = verify_record_signature(client_name, record)
+        logger.info(f"Signature of record ID {record_id} for client '{client_name}' valid: {is_valid}")
+        return jsonify({"record_id": record_id, "batch_id": str(record["batch_id"]) if "batch_id" in record else None, "valid": is_valid}), 200
 
     except Exception as e:
         logger.exception("Exception occurred")
         return jsonify({"error": "Internal Server Error"}), 500
 
-@app.route('/fetch-store-weather', methods=['GET'])
+@bp.route('/fetch-store-weather', methods=['GET'])
+@shed_load
 @validate_api_key(permission_required='fetch-store-weather')
 def fetch_weather():
     try:
@@ -612,7 +1676,7 @@ def fetch_weather():
         increment_requests_made(api_key)
 
         # Look up the client_name associated with the given API key
-        client_document = db.Customer_API_Keys.find_one({"clients.api_key": api_key})
+        client_document = get_db().Customer_API_Keys.find_one({"clients.api_key": api_key})
         if not client_document:
             logger.error("Invalid API key provided")
             return jsonify({"error": "Invalid API key"}), 401
@@ -624,7 +1688,7 @@ def fetch_weather():
 
         client_name = client['client_name']
 
-        # Fetch and store weather data, generate and store the transit key
+        # Fetch, encrypt and store weather data
         is_valid = fetch_and_store_weather(capital, client_name)
         if is_valid:
             logger.info(f"Weather data for capital '{capital}' fetched and stored successfully for client '{client_name}'")
@@ -636,7 +1700,66 @@ def fetch_weather():
         logger.exception("Exception occurred")
         return jsonify({"error": "Internal Server Error"}), 500
 
-@app.route('/fetch-only', methods=['GET'])
+def requested_capitals():
+    # Normalize each capital name the same way as the single-capital endpoint
+    return [' '.join(capital.split()) for capital in request.args.get('capitals', '').split(',') if capital.strip()]
+
+def bulk_request_cost():
+    # Every capital counts as a request, requests rejected as malformed cost nothing
+    capitals = requested_capitals()
+    return len(capitals) if len(capitals) <= BULK_INGEST_MAX_CAPITALS else 0
+
+@bp.route('/fetch-store-weather-bulk', methods=['GET'])
+@shed_load
+@validate_api_key(permission_required='fetch-store-weather', cost=bulk_request_cost)
+def fetch_weather_bulk():
+    try:
+        api_key = request.args.get('apikey', None)
+        capitals = requested_capitals()
+
+        if not capitals:
+            logger.error("No capitals provided")
+            return jsonify({"error": "Capitals are required"}), 400
+
+        if len(capitals) > BULK_INGEST_MAX_CAPITALS:
+            logger.error(f"Too many capitals in bulk request: {len(capitals)}")
+            return jsonify({"error": f"At most {BULK_INGEST_MAX_CAPITALS} capitals per request"}), 400
+
+        # Every capital counts as a request against the usage limit
+        increment_requests_made(api_key, len(capitals))
+
+        # Look up the client_name associated with the given API key
+        client_document = get_db().Customer_API_Keys.find_one({"clients.api_key": api_key})
+        if not client_document:
+            logger.error("Invalid API key provided")
+            return jsonify({"error": "Invalid API key"}), 401
+
+        client = next((client for client in client_document['clients'] if client['api_key'] == api_key), None)
+        if not client:
+            logger.error("Client not found for the provided API key")
+            return jsonify({"error": "Client not found"}), 401
+
+        client_name = client['client_name']
+
+        batch_id, stored, failed = fetch_and_store_weather_bulk(capitals, client_name)
+        if batch_id:
+            logger.info(f"Stored weather for {len(stored)} capitals in batch {batch_id} for client '{client_name}'")
+            return jsonify({
+                "message": "Weather data fetched and stored successfully",
+                "batch_id": str(batch_id),
+                "stored": stored,
+                "failed": failed,
+                "valid": True
+            }), 200
+        else:
+            logger.warning(f"Bulk weather ingest failed for client '{client_name}'")
+            return jsonify({"message": "Weather data could not be stored or signed", "failed": failed, "valid": False}), 500
+    except Exception as e:
+        logger.exception("Exception occurred")
+        return jsonify({"error": "Internal Server Error"}), 500
+
+@bp.route('/fetch-only', methods=['GET'])
+@shed_load
 @validate_api_key(permission_required='fetch-only')
 def fetch_only():
     try:
@@ -655,7 +1778,7 @@ def fetch_only():
         increment_requests_made(api_key)
 
         # Retrieve the client_name using the API key
-        client_document = db.Customer_API_Keys.find_one({"clients.api_key": api_key})
+        client_document = get_db().Customer_API_Keys.find_one({"clients.api_key": api_key})
         if not client_document:
             logger.error("Invalid API key provided")
             return jsonify({"error": "Invalid API key"}), 401
@@ -667,7 +1790,7 @@ def fetch_only():
 
         client_name = client['client_name']
 
-        domain_docs = customerDB[client_name].find_one()
+        domain_docs = get_customer_db()[client_name].find_one()
         if not domain_docs:
             logger.error(f"No domain documents found for client '{client_name}'")
             return jsonify({"error": "No domain documents found for this client"}), 404
@@ -718,7 +1841,7 @@ def fetch_only():
             return jsonify({"error": "Error in key processing or verification"}), 500
 
         # Proceed with the fetch operation if the validity check passes
-        location = capitals_data.get(capital.lower())
+        location = get_capitals_data().get(capital.lower())
         if not location:
             logger.error(f"Capital '{capital}' not found")
             return jsonify({"error": f"Capital '{capital}' not found"}), 404
@@ -726,18 +1849,14 @@ def fetch_only():
         lat, lon = location
         logger.info(f"Capital '{capital}' found with coordinates: {lat}, {lon}")
 
-        weather_data_openweather = fetch_weather_openweather(lat, lon)
-        weather_data_tomorrowio = fetch_weather_tomorrowio(lat, lon)
-        weather_data_visualcrossing = fetch_weather_visualcrossing(lat, lon)
+        provider_data = collect_weather_data(lat, lon)
 
-        if not weather_data_openweather or not weather_data_tomorrowio or not weather_data_visualcrossing:
-            logger.error("Failed to fetch weather data from one or more APIs")
-            return jsonify({"error": "Failed to fetch weather data from one or more APIs"}), 500
+        if not provider_data:
+            logger.error("Failed to fetch weather data from enough APIs")
+            return jsonify({"error": "Failed to fetch weather data from enough APIs"}), 500
 
         weather_data = {
-            "openweather": weather_data_openweather,
-            "tomorrowio": weather_data_tomorrowio,
-            "visualcrossing": weather_data_visualcrossing,
+            **provider_data,
             "timestamp": datetime.now(timezone.utc).isoformat()
         }
         logger.info(f"Fetched weather data: {weather_data}")
@@ -754,13 +1873,53 @@ def fetch_only():
         logger.exception("Exception occurred")
         return jsonify({"error": "Internal Server Error"}), 500
 
+# Set once this worker's pools are open and its caches are loaded
+worker_ready = False
+
+def warm_up():
+    """Opens this worker's connection pools and loads its caches before it accepts traffic."""
+    global worker_ready
+    get_capitals_data()
+    http_session.get()
+    mongo_client.get()
+    # The ping only warms the Mongo pool, whether the database is reachable is checked live by /ready
+    test_db_connection()
+    worker_ready = True
+    logger.info(f"Worker {os.getpid()} warm-up finished")
+    return worker_ready
+
+@bp.route('/ready', methods=['GET'])
+def ready():
+    if not worker_ready:
+        # Retry a warm-up that failed, or never ran under the dev server
+        try:
+            warm_up()
+        except Exception as e:
+            logger.error(f"Worker {os.getpid()} warm-up failed: {e}")
+            return jsonify({"status": "not ready"}), 503
+    if test_db_connection():
+        return jsonify({"status": "ready"}), 200
+    return jsonify({"status": "not ready"}), 503
+
+def create_app():
+    # Refuse to start rather than fail every write later on
+    check_master_key(KEYRING_MASTER_KEY)
+
+    app = Flask(__name__)
+    CORS(app)  # This will allow all domains to access your Flask app
+    app.register_blueprint(bp)
+    return app
+
 def handle_shutdown_signal(signum, frame):
     logger.info(f"Received shutdown signal ({signum}). Terminating gracefully.")
     sys.exit(0)
 
-signal.signal(signal.SIGTERM, handle_shutdown_signal)
-signal.signal(signal.SIGINT, handle_shutdown_signal)
-
 if __name__ == '__main__':
+    # Under gunicorn the arbiter owns signal handling, so these are only installed for the dev server
+    signal.signal(signal.SIGTERM, handle_shutdown_signal)
+    signal.signal(signal.SIGINT, handle_shutdown_signal)
+
     logger.info("Starting Flask application")
+    app = create_app()
+    warm_up()
     app.run(debug=True, host='0.0.0.0', port=8000)
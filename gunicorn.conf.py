@@ -0,0 +1,16 @@
+import os
+
+bind = "0.0.0.0:8000"
+loglevel = "info"
+accesslog = "-"
+workers = int(os.environ.get("GUNICORN_WORKERS", "2"))
+threads = int(os.environ.get("GUNICORN_THREADS", "4"))  # IBAS sizes its load shedding threshold from this too
+
+# Runs in each worker after the app is loaded and before it accepts connections
+def post_worker_init(worker):
+    from IBAS import warm_up
+    try:
+        warm_up()
+    except Exception as e:
+        # Keep the worker, /ready reports it not ready and retries the warm-up
+        worker.log.error(f"Warm-up failed: {e}")
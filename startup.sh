@@ -1,2 +1,2 @@
 #!/bin/bash
-gunicorn --bind=0.0.0.0:8000 IBAS:app --log-level=info --access-logfile=-
+gunicorn -c gunicorn.conf.py "IBAS:create_app()"
@@ -0,0 +1,576 @@
+import base64
+import gzip
+import json
+import time
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+import IBAS
+from bson import ObjectId
+from utils import generate_key, encrypt_bytes, encrypt_data, get_hashed_data, wrap_key
+
+MASTER_KEY = base64.b64encode(b"0" * 32).decode()
+READING = {"temperature": 20, "humidity": 50, "pressure": 1000, "windSpeed": 3, "cloudCover": 40, "precipitation": 0}
+
+
+def provider(delay=0.0, reading=READING):
+    def fetch(lat, lon):
+        time.sleep(delay)
+        if reading is None:
+            raise RuntimeError("provider down")
+        return dict(reading)
+    return fetch
+
+
+@pytest.fixture(autouse=True)
+def fresh_providers(monkeypatch):
+    monkeypatch.setattr(IBAS, "WEATHER_PROVIDERS", dict(IBAS.WEATHER_PROVIDERS))
+    monkeypatch.setattr(IBAS, "provider_breakers", {
+        name: IBAS.CircuitBreaker(name, 2, 60) for name in IBAS.WEATHER_PROVIDERS
+    })
+    monkeypatch.setattr(IBAS, "WEATHER_QUORUM_MODE", True)
+    monkeypatch.setattr(IBAS, "PROVIDER_TIMEOUT", 0.5)
+    monkeypatch.setattr(IBAS, "PROVIDER_HEDGE_DELAY", 0)
+
+
+@pytest.fixture
+def mongo(monkeypatch):
+    mongomock = pytest.importorskip("mongomock")
+    client = mongomock.MongoClient()
+    monkeypatch.setattr(IBAS, "mongo_client", IBAS.ForkSafeResource(lambda: client))
+    monkeypatch.setattr(IBAS, "keyring", IBAS.KeyRing(MASTER_KEY))
+    return client
+
+
+@pytest.fixture(scope="module")
+def domain_signer():
+    signer = IBAS.SimpleSigner("example__dot__com")
+    signer.generate_keys()
+    return signer
+
+
+def add_client(mongo, signer, usage_limit=1000):
+    private_pem, public_pem = signer.export_keys()
+    mongo["Customers"]["acme"].insert_one({
+        "domain": {signer.identity: 1},
+        f"pri_{signer.identity}_PEM": private_pem,
+        f"pub_{signer.identity}_PEM": public_pem
+    })
+    mongo["ibas-server"].Customer_API_Keys.insert_one({"clients": [{
+        "client_name": "acme",
+        "api_key": "key",
+        "permissions": ["fetch-store-weather", "get-historical-data"],
+        "usage_limit": usage_limit,
+        "requests_made": 0
+    }]})
+
+
+def use_providers(**fetchers):
+    IBAS.WEATHER_PROVIDERS.update(fetchers)
+
+
+def test_find_quorum_requires_every_field_settled():
+    cloudy = dict(READING, cloudCover=90)
+    assert IBAS.find_quorum({"openweather": READING, "tomorrowio": READING})
+    assert IBAS.find_quorum({"openweather": READING, "tomorrowio": cloudy}) is None
+
+    # Each field only needs one agreeing pair, not necessarily the same pair for every field
+    windy = dict(READING, windSpeed=30)
+    assert IBAS.find_quorum({"openweather": cloudy, "tomorrowio": windy, "visualcrossing": READING})
+
+
+def test_quorum_returns_without_waiting_for_slow_provider():
+    use_providers(openweather=provider(), tomorrowio=provider(), visualcrossing=provider(delay=2))
+
+    start = time.monotonic()
+    results = IBAS.collect_weather_data(0, 0)
+
+    assert time.monotonic() - start < 0.4
+    assert sorted(results) == ["openweather", "tomorrowio"]
+
+
+def test_disagreeing_pair_waits_for_third_provider():
+    use_providers(
+        openweather=provider(),
+        tomorrowio=provider(reading=dict(READING, cloudCover=90)),
+        visualcrossing=provider(delay=0.1)
+    )
+
+    results = IBAS.collect_weather_data(0, 0)
+
+    assert sorted(results) == ["openweather", "tomorrowio", "visualcrossing"]
+
+
+def test_no_quorum_when_only_one_provider_answers():
+    use_providers(openweather=provider(), tomorrowio=provider(reading=None), visualcrossing=provider(reading=None))
+
+    assert IBAS.collect_weather_data(0, 0) is None
+
+
+def test_consistently_slow_provider_opens_its_circuit():
+    use_providers(openweather=provider(), tomorrowio=provider(), visualcrossing=provider(delay=0.6))
+
+    for _ in range(2):
+        assert IBAS.collect_weather_data(0, 0)
+    time.sleep(0.7)  # Let the abandoned calls finish past the deadline
+
+    assert not IBAS.provider_breakers["visualcrossing"].allow_request()
+    assert IBAS.provider_breakers["openweather"].allow_request()
+
+
+def test_all_providers_required_outside_quorum_mode(monkeypatch):
+    monkeypatch.setattr(IBAS, "WEATHER_QUORUM_MODE", False)
+    use_providers(openweather=provider(), tomorrowio=provider(), visualcrossing=provider(reading=None))
+
+    assert IBAS.collect_weather_data(0, 0) is None
+
+
+def test_abandoned_calls_count_as_in_flight():
+    # Calls abandoned by earlier tests may still be running
+    for _ in range(20):
+        if IBAS.provider_calls_in_flight == 0:
+            break
+        time.sleep(0.1)
+
+    use_providers(openweather=provider(), tomorrowio=provider(), visualcrossing=provider(delay=0.3))
+
+    assert IBAS.collect_weather_data(0, 0)
+    assert IBAS.provider_calls_in_flight == 1
+
+    time.sleep(0.4)
+    assert IBAS.provider_calls_in_flight == 0
+
+
+def test_load_is_shed_once_in_flight_calls_reach_the_limit(monkeypatch):
+    monkeypatch.setattr(IBAS, "KEYRING_MASTER_KEY", MASTER_KEY)
+    monkeypatch.setattr(IBAS, "provider_calls_in_flight", IBAS.MAX_INFLIGHT_PROVIDER_CALLS)
+
+    response = IBAS.create_app().test_client().get('/fetch-only?apikey=any&capital=paris')
+
+    assert response.status_code == 503
+    assert response.headers['Retry-After'] == str(IBAS.LOAD_SHED_RETRY_AFTER)
+
+
+@pytest.mark.parametrize("master_key", [None, "", "not base64!", base64.b64encode(b"0" * 20).decode()])
+def test_invalid_master_key_is_rejected(master_key):
+    with pytest.raises(RuntimeError, match="KEYRING_MASTER_KEY"):
+        IBAS.check_master_key(master_key)
+
+
+@pytest.mark.parametrize("size", [16, 24, 32])
+def test_valid_master_key_is_accepted(size):
+    IBAS.check_master_key(base64.b64encode(b"0" * size).decode())
+
+
+def test_app_refuses_to_start_without_master_key(monkeypatch):
+    monkeypatch.setattr(IBAS, "KEYRING_MASTER_KEY", None)
+
+    with pytest.raises(RuntimeError, match="KEYRING_MASTER_KEY"):
+        IBAS.create_app()
+
+
+def test_rollup_round_trips_under_the_client_key():
+    kek = generate_key()
+    stats = {"count": 0, "fields": {}}
+    IBAS.fold_reading(stats, READING)
+    IBAS.fold_reading(stats, {"temperature": 30})
+    rollup = {"_id": "hour:2026-10-19T10:00:00Z", "data": IBAS.encrypt_rollup("hour:2026-10-19T10:00:00Z", stats, kek)}
+
+    assert IBAS.decrypt_rollup(rollup, kek) == stats
+    assert stats["count"] == 2
+    assert stats["fields"]["temperature"] == {"min": 20, "max": 30, "sum": 50, "count": 2}
+    assert stats["fields"]["humidity"]["count"] == 1
+
+
+def test_rollup_cannot_be_moved_to_another_bucket():
+    kek = generate_key()
+    data = IBAS.encrypt_rollup("hour:2026-10-19T10:00:00Z", {"count": 0, "fields": {}}, kek)
+
+    with pytest.raises(ValueError):
+        IBAS.decrypt_rollup({"_id": "hour:2026-10-19T11:00:00Z", "data": data}, kek)
+
+
+def test_ready_follows_the_live_database_ping(monkeypatch):
+    monkeypatch.setattr(IBAS, "KEYRING_MASTER_KEY", MASTER_KEY)
+    monkeypatch.setattr(IBAS, "worker_ready", False)
+    monkeypatch.setattr(IBAS, "get_capitals_data", lambda: {})
+    ping = {"ok": False}
+    monkeypatch.setattr(IBAS, "test_db_connection", lambda: ping["ok"])
+    client = IBAS.create_app().test_client()
+
+    # Warm-up finishing while the database is down doesn't leave the worker permanently unready
+    IBAS.warm_up()
+    assert client.get('/ready').status_code == 503
+
+    ping["ok"] = True
+    assert client.get('/ready').status_code == 200
+
+
+def test_ready_retries_a_failed_warm_up(monkeypatch):
+    monkeypatch.setattr(IBAS, "KEYRING_MASTER_KEY", MASTER_KEY)
+    monkeypatch.setattr(IBAS, "worker_ready", False)
+    monkeypatch.setattr(IBAS, "test_db_connection", lambda: True)
+    capitals = {"error": OSError("capitals.json missing")}
+
+    def get_capitals_data():
+        if capitals["error"]:
+            raise capitals["error"]
+        return {}
+    monkeypatch.setattr(IBAS, "get_capitals_data", get_capitals_data)
+    client = IBAS.create_app().test_client()
+
+    assert client.get('/ready').status_code == 503
+
+    capitals["error"] = None
+    assert client.get('/ready').status_code == 200
+    assert IBAS.worker_ready
+
+
+def test_token_bucket_takes_several_tokens_at_once():
+    bucket = IBAS.TokenBucket(10, 1)
+
+    assert bucket.consume(8) == (True, 0)
+    allowed, retry_after = bucket.consume(3)
+    assert not allowed
+    assert retry_after == pytest.approx(1, abs=0.05)
+    assert bucket.consume(2)[0]
+
+
+def test_bulk_request_cost_is_one_per_capital(monkeypatch):
+    monkeypatch.setattr(IBAS, "BULK_INGEST_MAX_CAPITALS", 3)
+    app = IBAS.Flask(__name__)
+
+    with app.test_request_context('/fetch-store-weather-bulk?capitals=paris, london ,,rome'):
+        assert IBAS.bulk_request_cost() == 3
+    # Requests the endpoint rejects as too large are not charged
+    with app.test_request_context('/fetch-store-weather-bulk?capitals=paris,london,rome,oslo'):
+        assert IBAS.bulk_request_cost() == 0
+
+
+def test_signatures_of_every_record_format_verify(mongo, domain_signer):
+    add_client(mongo, domain_signer)
+    # Legacy records were signed over their base64 ciphertext and store a hex signature
+    legacy_data = encrypt_data("{}", generate_key())
+    legacy = {"_id": 1, "data": legacy_data, "agg_sig": domain_signer.sign(legacy_data.encode()).hex()}
+    compact = {"_id": 2, "v": 2, "data": b"ciphertext", "agg_sig": domain_signer.sign(b"ciphertext")}
+    envelope = {"_id": 3, "v": 3, "data": b"envelope", "agg_sig": domain_signer.sign(b"envelope")}
+    batch, proofs = IBAS.sign_batch("acme", [b"first", b"second", b"third"])
+    batched = {"_id": 4, "v": 3, "data": b"second", "batch_id": batch["_id"], "leaf_index": 1, "proof": proofs[1]}
+
+    for record in (legacy, compact, envelope, batched):
+        assert IBAS.verify_record_signature("acme", record), record["_id"]
+
+    assert not IBAS.verify_record_signature("acme", dict(legacy, data=encrypt_data("{}", generate_key())))
+    assert not IBAS.verify_record_signature("acme", dict(envelope, data=b"tampered"))
+    assert not IBAS.verify_record_signature("acme", dict(batched, data=b"third"))
+
+
+def test_bulk_request_larger_than_the_burst_is_rejected_as_invalid(monkeypatch, mongo, domain_signer):
+    monkeypatch.setattr(IBAS, "KEYRING_MASTER_KEY", MASTER_KEY)
+    add_client(mongo, domain_signer)
+    capitals = ",".join(["paris"] * (IBAS.BULK_INGEST_MAX_CAPITALS + 1))
+
+    response = IBAS.create_app().test_client().get(f'/fetch-store-weather-bulk?apikey=key&capitals={capitals}')
+
+    assert IBAS.BULK_INGEST_MAX_CAPITALS <= IBAS.RATE_LIMIT_BURST
+    assert response.status_code == 400
+    assert str(IBAS.BULK_INGEST_MAX_CAPITALS) in response.get_json()["error"]
+
+
+HOUR = datetime(2026, 10, 19, 10, tzinfo=timezone.utc)
+
+
+def store_record(mongo, reading, recorded_at, age=timedelta(hours=1), **fields):
+    """Stores an envelope record the way build_weather_record does, with an _id from `age` ago."""
+    data_key = generate_key()
+    record = {
+        # The timestamp of `age` ago with the rest of a fresh ObjectId, so ids stay unique
+        "_id": ObjectId(ObjectId.from_datetime(datetime.now(timezone.utc) - age).binary[:4] + ObjectId().binary[4:]),
+        "v": 3,
+        "data": encrypt_bytes(json.dumps(reading, sort_keys=True, separators=(',', ':')).encode('utf-8'), data_key),
+        "key": wrap_key(data_key, IBAS.keyring.get_kek("acme")),
+        "timestamp": recorded_at.isoformat(),
+        **fields
+    }
+    mongo["Weather_Record"]["acme_Data"].insert_one(record)
+    return record["_id"]
+
+
+def stored_rollup(mongo, rollup_key):
+    rollup = mongo["Weather_Record"]["acme_Rollups"].find_one({"_id": rollup_key})
+    return rollup and IBAS.decrypt_rollup(rollup, IBAS.keyring.find_kek("acme"))
+
+
+def test_readings_are_folded_into_their_hour_and_day_buckets(mongo):
+    IBAS.apply_rollup_readings("acme", [
+        ({"temperature": 10}, HOUR + timedelta(minutes=5)),
+        ({"temperature": 14}, HOUR + timedelta(minutes=40)),
+        ({"temperature": 30}, HOUR + timedelta(hours=1, minutes=10))
+    ])
+    IBAS.apply_rollup_readings("acme", [({"temperature": 6}, HOUR + timedelta(minutes=50))])
+
+    assert stored_rollup(mongo, "hour:2026-10-19T10:00:00Z") == {
+        "count": 3, "fields": {"temperature": {"min": 6, "max": 14, "sum": 30, "count": 3}}
+    }
+    assert stored_rollup(mongo, "hour:2026-10-19T11:00:00Z")["count"] == 1
+    day = mongo["Weather_Record"]["acme_Rollups"].find_one({"_id": "day:2026-10-19T00:00:00Z"})
+    assert day["count"] == 4 and day["version"] == 2
+    assert stored_rollup(mongo, day["_id"])["fields"]["temperature"] == {"min": 6, "max": 30, "sum": 60, "count": 4}
+
+
+def test_backfill_folds_records_missing_from_the_rollups(mongo):
+    store_record(mongo, {"temperature": 10}, HOUR)  # Written before rollups existed
+    store_record(mongo, {"temperature": 20}, HOUR, age=timedelta(0), in_rollups=False)  # Rollup update failed
+    store_record(mongo, {"temperature": 99}, HOUR, in_rollups=True)  # Already rolled up
+    store_record(mongo, {"temperature": 99}, HOUR, age=timedelta(0))  # Still being written
+
+    assert IBAS.backfill_rollups("acme")
+
+    assert stored_rollup(mongo, "hour:2026-10-19T10:00:00Z")["fields"]["temperature"]["sum"] == 30
+    assert mongo["Weather_Record"]["acme_Data"].count_documents({"in_rollups": True}) == 3
+    assert mongo["Weather_Record"]["acme_Rollups"].find_one({"_id": "backfill"})["status"] == "done"
+
+
+def test_backfill_waits_for_a_live_claim_and_takes_over_a_stale_one(mongo):
+    store_record(mongo, {"temperature": 10}, HOUR)
+    rollups = mongo["Weather_Record"]["acme_Rollups"]
+    rollups.insert_one({"_id": "backfill", "status": "running", "claimed_at": datetime.now(timezone.utc)})
+
+    assert not IBAS.backfill_rollups("acme")
+    assert stored_rollup(mongo, "hour:2026-10-19T10:00:00Z") is None
+
+    stale = datetime.now(timezone.utc) - timedelta(seconds=IBAS.ROLLUP_BACKFILL_STALE_AFTER + 1)
+    rollups.update_one({"_id": "backfill"}, {"$set": {"claimed_at": stale}})
+
+    assert IBAS.backfill_rollups("acme")
+    assert stored_rollup(mongo, "hour:2026-10-19T10:00:00Z")["count"] == 1
+
+
+def test_failed_rollup_update_is_repaired_by_the_backfill(monkeypatch, mongo):
+    assert IBAS.backfill_rollups("acme")
+    record_id = store_record(mongo, {"temperature": 10}, HOUR, age=timedelta(0))
+
+    apply_rollup_readings = IBAS.apply_rollup_readings
+
+    def fail(client_name, readings):
+        raise RuntimeError("Rollup store unavailable")
+    monkeypatch.setattr(IBAS, "apply_rollup_readings", fail)
+    IBAS.update_rollups("acme", [record_id], [({"temperature": 10}, HOUR)])
+    monkeypatch.setattr(IBAS, "apply_rollup_readings", apply_rollup_readings)
+
+    assert mongo["Weather_Record"]["acme_Data"].find_one({"_id": record_id})["in_rollups"] is False
+    assert IBAS.backfill_rollups("acme")
+    assert stored_rollup(mongo, "hour:2026-10-19T10:00:00Z")["count"] == 1
+    assert not mongo["Weather_Record"]["acme_Rollups"].find_one({"_id": "backfill"})["repair_needed"]
+
+
+def test_rollup_history_serves_buckets_in_the_half_open_range(monkeypatch, mongo, domain_signer):
+    monkeypatch.setattr(IBAS, "KEYRING_MASTER_KEY", MASTER_KEY)
+    add_client(mongo, domain_signer)
+    IBAS.apply_rollup_readings("acme", [({"temperature": hour}, HOUR + timedelta(hours=hour)) for hour in range(-1, 3)])
+    client = IBAS.create_app().test_client()
+
+    response = client.get('/get-historical-data?apikey=key&resolution=hour&start=2026-10-19T10:00:00Z&end=2026-10-19T12:00:00Z')
+
+    assert [rollup["bucket"] for rollup in response.get_json()["rollups"]] == [
+        "2026-10-19T10:00:00+00:00", "2026-10-19T11:00:00+00:00"
+    ]
+    etag = response.headers["ETag"]
+    assert "2026-10-19T10:00:00+00:00" in etag and "2026-10-19T12:00:00+00:00" in etag
+
+    unchanged = client.get('/get-historical-data?apikey=key&resolution=hour&start=2026-10-19T10:00:00Z&end=2026-10-19T12:00:00Z',
+                           headers={"If-None-Match": etag})
+    assert unchanged.status_code == 304
+
+    IBAS.apply_rollup_readings("acme", [({"temperature": 5}, HOUR + timedelta(minutes=30))])
+    changed = client.get('/get-historical-data?apikey=key&resolution=hour&start=2026-10-19T10:00:00Z&end=2026-10-19T12:00:00Z',
+                         headers={"If-None-Match": etag})
+    assert changed.status_code == 200
+    assert changed.get_json()["rollups"][0]["count"] == 2
+
+
+@pytest.fixture
+def payload_client(monkeypatch):
+    monkeypatch.setattr(IBAS, "KEYRING_MASTER_KEY", MASTER_KEY)
+    app = IBAS.create_app()
+    app.add_url_rule('/payload/<int:size>/<int:status>', 'payload', lambda size, status: IBAS.json_response({"data": "x" * size}, status))
+    return app.test_client()
+
+
+def test_large_responses_prefer_brotli(payload_client):
+    pytest.importorskip("brotli")
+    response = payload_client.get('/payload/4096/200', headers={"Accept-Encoding": "gzip, br"})
+
+    assert response.headers["Content-Encoding"] == "br"
+    assert "Accept-Encoding" in response.headers["Vary"]
+    assert json.loads(IBAS.brotli.decompress(response.data)) == {"data": "x" * 4096}
+
+
+def test_encodings_refused_with_q_zero_are_not_used(payload_client):
+    response = payload_client.get('/payload/4096/200', headers={"Accept-Encoding": "br;q=0, gzip"})
+    assert response.headers["Content-Encoding"] == "gzip"
+    assert json.loads(gzip.decompress(response.data)) == {"data": "x" * 4096}
+
+    response = payload_client.get('/payload/4096/200', headers={"Accept-Encoding": "br;q=0, gzip;q=0"})
+    assert "Content-Encoding" not in response.headers
+
+
+def test_small_and_unsuccessful_responses_are_not_compressed(payload_client):
+    small = payload_client.get('/payload/10/200', headers={"Accept-Encoding": "gzip"})
+    failed = payload_client.get('/payload/4096/500', headers={"Accept-Encoding": "gzip"})
+
+    assert "Content-Encoding" not in small.headers
+    assert "Content-Encoding" not in failed.headers
+    assert failed.get_json() == {"data": "x" * 4096}
+
+
+@pytest.mark.parametrize("use_orjson", [True, False])
+def test_json_response_with_and_without_orjson(monkeypatch, use_orjson):
+    if use_orjson:
+        pytest.importorskip("orjson")
+    else:
+        monkeypatch.setattr(IBAS, "orjson", None)
+    payload = {"temperature": 20.5, "name": "Zürich", "values": [1, None, True]}
+
+    response = IBAS.json_response(payload, 201)
+
+    assert response.status_code == 201
+    assert response.mimetype == "application/json"
+    assert json.loads(response.get_data()) == payload
+
+
+def test_unchanged_history_answers_304_without_decrypting(monkeypatch, mongo, domain_signer):
+    monkeypatch.setattr(IBAS, "KEYRING_MASTER_KEY", MASTER_KEY)
+    add_client(mongo, domain_signer)
+    store_record(mongo, READING, HOUR)
+    client = IBAS.create_app().test_client()
+
+    response = client.get('/get-historical-data?apikey=key')
+    etag = response.headers["ETag"]
+    assert response.status_code == 200
+    assert response.headers["Cache-Control"] == "private, no-cache"
+    assert len(response.get_json()["historical_data"]) == 1
+
+    decrypt_records = IBAS.decrypt_records
+
+    def fail(client_name, records):
+        raise AssertionError("Records decrypted for an unchanged history")
+    monkeypatch.setattr(IBAS, "decrypt_records", fail)
+
+    unchanged = client.get('/get-historical-data?apikey=key', headers={"If-None-Match": etag})
+    assert unchanged.status_code == 304
+    assert unchanged.headers["ETag"] == etag
+    assert unchanged.data == b""
+
+    monkeypatch.setattr(IBAS, "decrypt_records", decrypt_records)
+    store_record(mongo, READING, HOUR, age=timedelta(0))
+    changed = client.get('/get-historical-data?apikey=key', headers={"If-None-Match": etag})
+    assert changed.status_code == 200
+    assert changed.headers["ETag"] != etag
+    assert len(changed.get_json()["historical_data"]) == 2
+
+
+class TransitKeys:
+    """Stands in for the Transit_Key collection, answering only the $in lookup decrypt_records makes."""
+
+    def __init__(self, keys):
+        self.keys = keys
+
+    def find(self, query):
+        return [{"weather_record_id": record_id, "key": self.keys[record_id]}
+                for record_id in query["weather_record_id"]["$in"] if record_id in self.keys]
+
+
+def serialized(reading):
+    return json.dumps(reading, sort_keys=True, separators=(',', ':'))
+
+
+def legacy_record(record_id, reading):
+    return {"_id": record_id, "data": encrypt_data(serialized(reading), TRANSIT_KEYS[record_id]), "hash": get_hashed_data(serialized(reading))}
+
+
+def compact_record(record_id, reading):
+    return {"_id": record_id, "v": 2, "data": encrypt_bytes(serialized(reading).encode('utf-8'), TRANSIT_KEYS[record_id])}
+
+
+TRANSIT_KEYS = {"legacy": generate_key(), "compact": generate_key(), "tampered": generate_key()}
+
+
+@pytest.fixture
+def transit_keys(monkeypatch):
+    monkeypatch.setattr(IBAS, "get_transit_key_db", lambda: {"acme_transitKeys": TransitKeys(TRANSIT_KEYS)})
+
+
+def decrypted(records):
+    return {record["_id"]: data for record, data in IBAS.decrypt_records("acme", records)}
+
+
+def test_legacy_and_compact_records_stay_readable(transit_keys):
+    tampered = compact_record("tampered", READING)
+    tampered["data"] = tampered["data"][:-1] + bytes([tampered["data"][-1] ^ 1])
+    records = [
+        legacy_record("legacy", READING),
+        compact_record("compact", dict(READING, temperature=21)),
+        tampered,
+        compact_record("compact", READING) | {"_id": "no transit key"}
+    ]
+
+    result = decrypted(records)
+
+    assert sorted(result) == ["compact", "legacy"]
+    assert json.loads(result["legacy"]) == READING
+    assert json.loads(result["compact"]) == dict(READING, temperature=21)
+
+
+def envelope_record(record_id, reading, kek):
+    data_key = generate_key()
+    return {
+        "_id": record_id,
+        "v": 3,
+        "data": encrypt_bytes(serialized(reading).encode('utf-8'), data_key),
+        "key": wrap_key(data_key, kek)
+    }
+
+
+@pytest.fixture
+def client_kek(monkeypatch):
+    kek = generate_key()
+    lookups = []
+
+    def find_kek(client_name):
+        lookups.append(client_name)
+        return kek
+    monkeypatch.setattr(IBAS.keyring, "find_kek", find_kek)
+    return kek, lookups
+
+
+def test_envelope_records_decrypt_under_the_client_key(transit_keys, client_kek):
+    kek, lookups = client_kek
+    records = [envelope_record("first", READING, kek), envelope_record("second", dict(READING, humidity=60), kek)]
+
+    result = decrypted(records)
+
+    assert json.loads(result["first"]) == READING
+    assert json.loads(result["second"]) == dict(READING, humidity=60)
+    assert lookups == ["acme"]  # One key lookup per batch, not per record
+
+
+@pytest.mark.parametrize("field", ["data", "key"])
+def test_tampered_envelope_record_is_skipped(transit_keys, client_kek, field):
+    kek, _ = client_kek
+    tampered = envelope_record("tampered", READING, kek)
+    tampered[field] = tampered[field][:-1] + bytes([tampered[field][-1] ^ 1])
+
+    assert decrypted([tampered, envelope_record("intact", READING, kek)]).keys() == {"intact"}
+
+
+def test_missing_client_key_skips_only_envelope_records(monkeypatch, transit_keys):
+    monkeypatch.setattr(IBAS.keyring, "find_kek", lambda client_name: None)
+    records = [
+        legacy_record("legacy", READING),
+        envelope_record("envelope", READING, generate_key()),
+        compact_record("compact", READING)
+    ]
+
+    assert sorted(decrypted(records)) == ["compact", "legacy"]
@@ -0,0 +1,114 @@
+import pytest
+
+from utils import (
+    generate_key, encrypt_bytes, decrypt_bytes, encrypt_data, decrypt_data, get_hashed_data, check_hash, wrap_key, unwrap_key,
+    merkle_leaf_hash, build_merkle_tree, verify_merkle_proof
+)
+
+
+def flip_byte(data, index):
+    return data[:index] + bytes([data[index] ^ 1]) + data[index + 1:]
+
+
+def test_compact_ciphertext_round_trips():
+    key = generate_key()
+    plaintext = b'{"humidity":50.0,"temperature":20.5}'
+
+    ciphertext = encrypt_bytes(plaintext, key)
+
+    assert isinstance(ciphertext, bytes)
+    assert len(ciphertext) == 32 + len(plaintext)  # Nonce and tag, then the ciphertext with no encoding overhead
+    assert decrypt_bytes(ciphertext, key) == plaintext
+
+
+@pytest.mark.parametrize("index", [0, 20, -1])  # Nonce, tag and ciphertext
+def test_tampered_compact_ciphertext_is_rejected(index):
+    key = generate_key()
+    ciphertext = encrypt_bytes(b'{"temperature":20.5}', key)
+
+    with pytest.raises(ValueError):
+        decrypt_bytes(flip_byte(ciphertext, index % len(ciphertext)), key)
+
+
+def test_compact_ciphertext_needs_its_own_key():
+    ciphertext = encrypt_bytes(b'{"temperature":20.5}', generate_key())
+
+    with pytest.raises(ValueError):
+        decrypt_bytes(ciphertext, generate_key())
+
+
+def test_data_key_round_trips_through_wrapping():
+    data_key, kek = generate_key(), generate_key()
+
+    wrapped = wrap_key(data_key, kek)
+
+    assert unwrap_key(wrapped, kek) == data_key
+    with pytest.raises(ValueError):
+        unwrap_key(wrapped, generate_key())
+    with pytest.raises(ValueError):
+        unwrap_key(flip_byte(wrapped, len(wrapped) - 1), kek)
+
+
+def test_legacy_format_still_round_trips():
+    key = generate_key()
+    serialized = '{"temperature":20.5}'
+
+    encrypted = encrypt_data(serialized, key)
+
+    assert isinstance(encrypted, str)
+    assert decrypt_data(encrypted, key) == serialized
+    assert check_hash(serialized, get_hashed_data(serialized))
+
+
+def leaves(count):
+    return [merkle_leaf_hash(f"record {i}".encode()) for i in range(count)]
+
+
+@pytest.mark.parametrize("size", [1, 2, 3, 4, 5, 7, 8, 13])
+def test_every_proof_leads_to_the_root(size):
+    hashes = leaves(size)
+    root, proofs = build_merkle_tree(hashes)
+
+    for index, (leaf_hash, proof) in enumerate(zip(hashes, proofs)):
+        assert verify_merkle_proof(leaf_hash, index, size, proof, root)
+
+
+def test_single_leaf_is_its_own_root():
+    hashes = leaves(1)
+    root, proofs = build_merkle_tree(hashes)
+
+    assert root == hashes[0]
+    assert proofs == [[]]
+
+
+def test_tampered_leaf_is_rejected():
+    hashes = leaves(5)
+    root, proofs = build_merkle_tree(hashes)
+
+    assert not verify_merkle_proof(merkle_leaf_hash(b"forged"), 2, 5, proofs[2], root)
+
+
+def test_tampered_proof_is_rejected():
+    hashes = leaves(5)
+    root, proofs = build_merkle_tree(hashes)
+    proof = list(proofs[1])
+    proof[0] = bytes(32)
+
+    assert not verify_merkle_proof(hashes[1], 1, 5, proof, root)
+
+
+def test_proof_for_another_position_is_rejected():
+    hashes = leaves(5)
+    root, proofs = build_merkle_tree(hashes)
+
+    assert not verify_merkle_proof(hashes[1], 2, 5, proofs[1], root)
+    assert not verify_merkle_proof(hashes[1], 5, 5, proofs[1], root)
+
+
+def test_truncated_or_padded_proof_is_rejected():
+    hashes = leaves(5)
+    root, proofs = build_merkle_tree(hashes)
+
+    assert not verify_merkle_proof(hashes[0], 0, 5, proofs[0][:-1], root)
+    assert not verify_merkle_proof(hashes[0], 0, 5, proofs[0] + [bytes(32)], root)
+
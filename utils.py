@@ -7,6 +7,32 @@ import json
 def generate_key():
     return b64encode(os.urandom(16)).decode('utf-8')
 
+# Version tags of the stored record formats. Both store raw ciphertext bytes and no separate hash.
+# Version 2 keeps its data key in the Transit_Key database, version 3 carries it inline, wrapped
+# under the client's key-encryption key
+COMPACT_RECORD_FORMAT_VERSION = 2
+RECORD_FORMAT_VERSION = 3
+
+def encrypt_bytes(data, key):
+    key_bytes = b64decode(key)  # Decode the base64 key to bytes
+    cipher = AES.new(key_bytes, AES.MODE_GCM)  # Create a new AES cipher object in GCM mode
+    ciphertext, tag = cipher.encrypt_and_digest(data)  # Encrypt the raw bytes and get the tag
+    return cipher.nonce + tag + ciphertext  # Combine nonce, tag, and ciphertext without any text encoding
+
+def decrypt_bytes(data, key):
+    key_bytes = b64decode(key)  # Decode the base64 key to bytes
+    nonce = data[:16]  # Extract the nonce from the data
+    tag = data[16:32]  # Extract the tag from the data
+    ciphertext = data[32:]  # Extract the ciphertext from the data
+    cipher = AES.new(key_bytes, AES.MODE_GCM, nonce=nonce)  # Create a new AES cipher object with the nonce
+    return cipher.decrypt_and_verify(ciphertext, tag)  # Decrypt the ciphertext and verify the tag, raises ValueError if tampered
+
+def wrap_key(key, kek):
+    return encrypt_bytes(b64decode(key), kek)  # Encrypt the raw data key under the key-encryption key
+
+def unwrap_key(wrapped_key, kek):
+    return b64encode(decrypt_bytes(wrapped_key, kek)).decode('utf-8')  # Return the data key in the same base64 form as generate_key
+
 def encrypt_data(data, key):
     key_bytes = b64decode(key)  # Decode the base64 key to bytes
     cipher = AES.new(key_bytes, AES.MODE_GCM)  # Create a new AES cipher object in GCM mode
@@ -15,17 +41,56 @@ def encrypt_data(data, key):
     return b64encode(cipher.nonce + tag + ciphertext).decode('utf-8')
 
 def decrypt_data(encrypted_data, key):
-    key_bytes = b64decode(key)  # Decode the base64 key to bytes
     data = b64decode(encrypted_data)  # Decode the base64 encrypted data to bytes
-    nonce = data[:16]  # Extract the nonce from the data
-    tag = data[16:32]  # Extract the tag from the data
-    ciphertext = data[32:]  # Extract the ciphertext from the data
-    cipher = AES.new(key_bytes, AES.MODE_GCM, nonce=nonce)  # Create a new AES cipher object with the nonce
-    decrypted_data = cipher.decrypt_and_verify(ciphertext, tag)  # Decrypt the ciphertext and verify the tag
+    decrypted_data = decrypt_bytes(data, key)  # Decrypt the data and verify the tag
     return json.loads(decrypted_data.decode('utf-8'))  # Decode the decrypted data from JSON
 
 def get_hashed_data(data):
     return sha256(data.encode('utf-8')).hexdigest()
 
 def check_hash(data, hash):
-    return get_hashed_data(data) == hash
\ No newline at end of file
+    return get_hashed_data(data) == hash
+
+def merkle_leaf_hash(data):
+    return sha256(b'\x00' + data).digest()  # Leaves and inner nodes are prefixed differently so one can't pose as the other
+
+def merkle_node_hash(left, right):
+    return sha256(b'\x01' + left + right).digest()
+
+def build_merkle_tree(leaves):
+    # Build the tree level by level, carrying an odd node out up to the next level unchanged
+    levels = [list(leaves)]
+    while len(levels[-1]) > 1:
+        level = levels[-1]
+        next_level = [merkle_node_hash(level[i], level[i + 1]) for i in range(0, len(level) - 1, 2)]
+        if len(level) % 2:
+            next_level.append(level[-1])
+        levels.append(next_level)
+
+    # The inclusion proof of a leaf is its sibling on every level where it has one
+    proofs = []
+    for index in range(len(leaves)):
+        proof = []
+        for level in levels[:-1]:
+            if index ^ 1 < len(level):
+                proof.append(level[index ^ 1])
+            index //= 2
+        proofs.append(proof)
+    return levels[-1][0], proofs
+
+def verify_merkle_proof(leaf_hash, index, size, proof, root):
+    if not 0 <= index < size:
+        return False
+    node = leaf_hash
+    siblings = iter(proof)
+    try:
+        while size > 1:
+            if index % 2:
+                node = merkle_node_hash(next(siblings), node)
+            elif index + 1 < size:
+                node = merkle_node_hash(node, next(siblings))
+            index //= 2
+            size = (size + 1) // 2
+    except StopIteration:
+        return False  # Proof too short
+    return next(siblings, None) is None and node == root